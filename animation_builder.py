@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+动画构建核心 - 不依赖 Qt，根据不可变的项目快照生成 bootanimation.zip
+
+帧编码任务提交到调用方提供的共享线程池，多个构建可以在同一工作线程
+预算下并发执行；每个构建只保留有限数量的在途任务，使各任务交替推进。
+"""
+
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+import archive_manifest
+import encoder_backends
+import fps_retarget
+import frame_encoder
+from build_journal import BuildJournal, frame_key
+
+
+class FrameSpec(NamedTuple):
+    """快照中的一帧"""
+    path: str
+    format: str
+    segment: int
+
+
+class SegmentParams(NamedTuple):
+    """快照中一个段落的播放参数"""
+    loop: int
+    pause: int
+
+
+class BuildSpec(NamedTuple):
+    """构建时的项目快照，创建后不再受界面编辑影响"""
+    frames: Tuple[FrameSpec, ...]
+    output_path: str
+    fps: int
+    segment_params: Tuple[SegmentParams, ...]
+    source_fps: Optional[int] = None
+    quality: int = frame_encoder.DEFAULT_JPEG_QUALITY
+    keep_cache: bool = False # 成功后保留临时目录作为增量构建缓存
+    cache_dir: Optional[str] = None # 多个构建共享的编码帧缓存目录
+    # 编码后端名称，默认固定为 Pillow 以保证同一项目在任何机器上得到相同的字节；
+    # "auto" 按本机基准测试选择最快的后端，输出会随机器而不同
+    encoder_backend: str = encoder_backends.DEFAULT_BACKEND
+
+
+class BuildError(Exception):
+    """构建失败，消息可直接展示给用户"""
+
+
+class BuildCancelled(Exception):
+    """构建被取消，已完成的帧保留在检查点中"""
+
+    def __init__(self, completed_count):
+        super().__init__(f"已取消，已完成 {completed_count} 帧，再次创建时将从断点继续")
+        self.completed_count = completed_count
+
+
+def default_worker_count():
+    """默认的共享编码线程数"""
+    return os.cpu_count() or 1
+
+
+def snapshot_project(images_data, output_path, fps, segment_params_list, source_fps=None,
+                     quality=frame_encoder.DEFAULT_JPEG_QUALITY, keep_cache=False,
+                     encoder_backend=encoder_backends.DEFAULT_BACKEND):
+    """从界面的图片数据和段落参数创建不可变快照，不修改 images_data"""
+    frames = tuple(
+        FrameSpec(str(img_d['path']), (img_d.get('format') or '').upper(), img_d.get('segment') or 0)
+        for img_d in images_data
+    )
+    segment_params = tuple(
+        SegmentParams(params.get('loop', 0), params.get('pause', 0)) for params in segment_params_list
+    )
+    return BuildSpec(frames, str(output_path), fps, segment_params, source_fps, quality, keep_cache,
+                     encoder_backend=encoder_backend)
+
+
+def temp_dir_for(output_path):
+    """输出文件对应的临时目录 (检查点所在位置)"""
+    output_path = Path(output_path)
+    return output_path.parent / f"temp_{output_path.stem}"
+
+
+def _submit_encode(executor, source_path, save_format, quality, dest_path, backend=None):
+    """提交一帧编码任务；远程编码池 (encode_worker.RemoteEncoderPool) 提供自己的 submit_encode"""
+    submit_encode = getattr(executor, 'submit_encode', None)
+    if submit_encode is not None:
+        return submit_encode(source_path, save_format, quality, dest_path, backend)
+    return executor.submit(frame_encoder.encode_frame, source_path, save_format, quality, dest_path, backend)
+
+
+def _encode_frames(spec, segment_frames, encode_tasks, journal, executor, max_in_flight,
+                   progress_callback, is_cancelled, backends):
+    """把编码任务提交到共享线程池
+
+    返回 ({(段落, 源帧下标): 编码文件}, 复用帧数, 新编码帧数, {格式: 实际使用的后端集合})。
+    """
+    encoded_files = {}
+    used_backends = {}
+    counters = {'resumed': 0, 'encoded': 0, 'done': 0}
+    total = len(encode_tasks)
+    task_iter = iter(encode_tasks)
+    pending = {}
+    start = time.perf_counter()
+
+    def report():
+        counters['done'] += 1
+        if progress_callback and total:
+            elapsed = time.perf_counter() - start
+            frames_per_second = counters['encoded'] / elapsed if elapsed > 0 else 0.0
+            progress_callback(int(counters['done'] / total * 80), frames_per_second)
+
+    def submit_next():
+        for seg_idx, src_idx in task_iter:
+            frame = segment_frames[seg_idx][src_idx]
+            save_format, output_extension = frame_encoder.output_format(frame.format)
+            backend = backends[save_format]
+            try:
+                key = frame_key(frame.path, save_format, spec.quality, backend)
+            except FileNotFoundError:
+                print(f"错误: 无法找到图片文件 {frame.path}，跳过。")
+                report()
+                continue
+            done_path = journal.lookup(key, output_extension)
+            if done_path is not None:
+                # 帧键包含后端，缓存中的帧正是由该后端编码的
+                encoded_files[(seg_idx, src_idx)] = done_path
+                used_backends.setdefault(save_format, set()).add(backend)
+                counters['resumed'] += 1
+                report()
+                continue
+            final_path = journal.frame_path(key, output_extension)
+            future = _submit_encode(executor, frame.path, save_format, spec.quality, final_path, backend)
+            pending[future] = (seg_idx, src_idx, key, final_path, frame.path, save_format, backend)
+            return True
+        return False
+
+    def collect(done_futures):
+        for future in done_futures:
+            seg_idx, src_idx, key, final_path, source_path, save_format, backend = pending.pop(future)
+            if future.cancelled():
+                continue
+            try:
+                _, used_backend = future.result()
+                if used_backend != backend:
+                    # 后端不可用或出错时改用了其他后端：按实际后端的帧键存放，缓存不会混入其他后端的输出
+                    key = frame_key(source_path, save_format, spec.quality, used_backend)
+                    used_path = journal.frame_path(key, final_path.suffix.lstrip('.'))
+                    os.replace(final_path, used_path)
+                    final_path = used_path
+            except FileNotFoundError:
+                print(f"错误: 无法找到图片文件 {source_path}，跳过。")
+            except BrokenExecutor:
+                # 编码池已不可用 (例如工作进程被杀死)，其余帧都会失败，中止构建而不是输出缺帧的归档
+                raise
+            except Exception as img_e:
+                print(f"错误: 处理图片 {source_path} 时发生错误: {img_e}，跳过。")
+            else:
+                journal.record(key, final_path)
+                encoded_files[(seg_idx, src_idx)] = final_path
+                used_backends.setdefault(save_format, set()).add(used_backend)
+                counters['encoded'] += 1
+            report()
+
+    while len(pending) < max_in_flight and submit_next():
+        pass
+    while pending:
+        if is_cancelled and is_cancelled():
+            for future in pending:
+                future.cancel()
+            done_futures, _ = wait(list(pending))
+            collect(done_futures)
+            raise BuildCancelled(len(journal.entries))
+        done_futures, _ = wait(list(pending), timeout=0.2, return_when=FIRST_COMPLETED)
+        collect(done_futures)
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+    return encoded_files, counters['resumed'], counters['encoded'], used_backends
+
+
+def build_animation(spec, executor=None, progress_callback=None, is_cancelled=None, max_in_flight=None):
+    """根据快照构建 bootanimation.zip
+
+    executor: 共享的编码线程池或远程编码池，为 None 时临时创建一个本机线程池。
+    progress_callback(百分比, 编码速度帧/秒): 进度回调。
+    is_cancelled(): 返回 True 时尽快停止并抛出 BuildCancelled。
+    成功时返回结果字典，失败时抛出 BuildError。
+    """
+    start = time.perf_counter()
+    output_path = Path(spec.output_path)
+    temp_dir = temp_dir_for(output_path)
+    journal = BuildJournal(temp_dir, spec.cache_dir)
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=default_worker_count())
+    if max_in_flight is None:
+        max_in_flight = getattr(executor, 'worker_count', default_worker_count()) * 2
+    build_succeeded = False
+    try:
+        journal.open()
+
+        if not spec.frames:
+            raise BuildError("没有图片可处理。")
+
+        first_valid_image_path = next((frame.path for frame in spec.frames if Path(frame.path).exists()), None)
+        if not first_valid_image_path:
+            raise BuildError("没有有效的图片文件路径。")
+        with Image.open(first_valid_image_path) as img_for_size:
+            width, height = img_for_size.size
+
+        active_segments = sorted(set(frame.segment for frame in spec.frames))
+
+        # 按段落分组，保持导入顺序
+        segment_frames = {seg_idx: [] for seg_idx in active_segments}
+        for frame in spec.frames:
+            segment_frames[frame.segment].append(frame)
+
+        # 每段输出帧 -> 源帧下标；帧率重定向时只编码被引用到的源帧，重复帧复用同一编码结果
+        segment_frame_maps = {}
+        for seg_idx in active_segments:
+            frame_count = len(segment_frames[seg_idx])
+            if spec.source_fps and spec.source_fps != spec.fps:
+                segment_frame_maps[seg_idx] = fps_retarget.remap_indices(frame_count, spec.source_fps, spec.fps)
+            else:
+                segment_frame_maps[seg_idx] = list(range(frame_count))
+
+        encode_tasks = [(seg_idx, src_idx) for seg_idx in active_segments
+                        for src_idx in sorted(set(segment_frame_maps[seg_idx]))]
+        # 每种格式使用的编码后端 ("auto" 时首次使用会做一次基准测试，结果有缓存)
+        backends = encoder_backends.resolve_backends(spec.encoder_backend)
+        encoded_files, resumed_count, encoded_count, backend_sets = _encode_frames(
+            spec, segment_frames, encode_tasks, journal, executor, max_in_flight,
+            progress_callback, is_cancelled, backends
+        )
+        # 报告和清单中记录实际产生这些帧的后端，多个后端时以 + 连接
+        # 按格式排序，与帧完成编码的先后无关
+        used_backends = {save_format: "+".join(sorted(backend_sets[save_format]))
+                         for save_format in sorted(backend_sets)}
+
+        if is_cancelled and is_cancelled():
+            raise BuildCancelled(len(journal.entries))
+
+        # 每段最终写入 ZIP 的帧序列 (跳过编码失败的源帧)
+        segment_entries = {}
+        for seg_idx in active_segments:
+            segment_entries[seg_idx] = [encoded_files[(seg_idx, src_idx)] for src_idx in segment_frame_maps[seg_idx]
+                                        if (seg_idx, src_idx) in encoded_files]
+
+        desc_content_lines = [f"{width} {height} {spec.fps}"]
+        for seg_idx in active_segments:
+            if segment_entries[seg_idx]:
+                params = spec.segment_params[seg_idx] if seg_idx < len(spec.segment_params) else SegmentParams(0, 0)
+                desc_content_lines.append(f"p {params.loop} {params.pause} part{seg_idx}")
+
+        if len(desc_content_lines) == 1:
+            raise BuildError("没有成功处理任何图片段落以生成动画。")
+
+        desc_content = "\n".join(desc_content_lines) + "\n"
+
+        if progress_callback:
+            progress_callback(90, 0.0)
+
+        # 先写入临时文件，完成后再替换，避免中断时留下损坏的 ZIP。
+        # 条目顺序和时间戳固定，同一项目重复构建得到相同的字节
+        partial_output_path = output_path.with_name(output_path.name + ".part")
+        frame_total = 0
+        with archive_manifest.DeterministicZipWriter(partial_output_path) as zip_writer:
+            zip_writer.writestr(archive_manifest.DESC_NAME, desc_content.encode('utf-8'))
+
+            for seg_idx in active_segments:
+                zip_target_dir = f"part{seg_idx}"
+                for frame_idx, img_file in enumerate(segment_entries[seg_idx]):
+                    zip_writer.write_file(img_file, f"{zip_target_dir}/{frame_idx:05d}{img_file.suffix}")
+                    frame_total += 1
+        # 清单 (每帧、每段和整个归档的 SHA-256) 在替换归档之前写入临时文件；
+        # 替换前先删除旧清单，任何一步失败都不会留下与归档不符的清单
+        manifest = archive_manifest.build_manifest(partial_output_path, zip_writer.entries,
+                                                   {'encoder_backends': used_backends}, name=output_path.name)
+        manifest_path = archive_manifest.manifest_path_for(output_path)
+        partial_manifest_path = manifest_path.with_name(manifest_path.name + ".part")
+        archive_manifest.write_manifest(manifest, partial_manifest_path)
+        try:
+            manifest_path.unlink()
+        except FileNotFoundError:
+            pass
+        os.replace(partial_output_path, output_path)
+        os.replace(partial_manifest_path, manifest_path)
+        build_succeeded = True
+        if spec.keep_cache:
+            journal.compact(encoded_files.values())
+
+        if progress_callback:
+            progress_callback(100, 0.0)
+
+        message = "动画创建成功！"
+        if resumed_count and (spec.keep_cache or spec.cache_dir):
+            message += f"(新编码 {encoded_count} 帧，复用缓存 {resumed_count} 帧)"
+        elif resumed_count:
+            message += f"(从断点恢复 {resumed_count} 帧)"
+        message += f"\n编码后端: {encoder_backends.format_backends(used_backends)}"
+        return {
+            'message': message,
+            'output_path': str(output_path),
+            'manifest_path': str(manifest_path),
+            'sha256': manifest['archive']['sha256'],
+            'frames': frame_total,
+            'encoded': encoded_count,
+            'resumed': resumed_count,
+            'backends': used_backends,
+            'bytes': output_path.stat().st_size,
+            'elapsed': time.perf_counter() - start,
+        }
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
+        journal.close()
+        # 只有成功时才清理临时目录；取消或出错时保留检查点以便续建
+        cleanup = (build_succeeded and not spec.keep_cache) or not journal.entries
+        if cleanup and temp_dir.exists():
+            try:
+                shutil.rmtree(temp_dir)
+            except Exception as e_clean:
+                print(f"清理临时目录 {temp_dir} 时出错: {e_clean}")
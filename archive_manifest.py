@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+归档清单 - 确定性地写出 bootanimation.zip，并生成记录内容哈希的清单文件
+
+同一项目重复构建得到的 ZIP 字节完全相同：条目按 desc.txt、part0、part1 ... 的顺序
+写入，段内按帧序号排列，时间戳和文件属性固定，不受临时文件和文件系统影响。
+清单 (<输出文件>.manifest.json) 记录每帧、每个段落和 desc.txt 的 SHA-256，
+CI 可以据此跳过未变化的归档，只在设备上测试变化的段落。
+
+用法:
+    python archive_manifest.py diff 旧.zip 新.zip [--json]
+    python archive_manifest.py manifest bootanimation.zip
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zipfile
+import zlib
+from pathlib import Path
+
+MANIFEST_VERSION = 2
+MANIFEST_SUFFIX = ".manifest.json"
+DESC_NAME = "desc.txt"
+ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0) # ZIP 格式能表示的最早时间
+ZIP_FILE_MODE = 0o644
+
+
+def manifest_path_for(archive_path):
+    """归档对应的清单文件路径"""
+    archive_path = Path(archive_path)
+    return archive_path.with_name(archive_path.name + MANIFEST_SUFFIX)
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _part_of(name):
+    """条目所属的段落名，desc.txt 等根目录文件返回 None"""
+    return name.split('/', 1)[0] if '/' in name else None
+
+
+def _part_digest(frames):
+    """段落哈希：按顺序对 (条目名, 帧哈希) 计算，帧内容、顺序或数量变化都会改变它"""
+    digest = hashlib.sha256()
+    for frame in frames:
+        digest.update(f"{frame['name']} {frame['sha256']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _entry(name, data):
+    return {'name': name, 'sha256': _sha256(data), 'crc32': f"{zlib.crc32(data):08x}", 'size': len(data)}
+
+
+class DeterministicZipWriter:
+    """以固定时间戳和属性写入 ZIP 条目 (不压缩)，并记录每个条目的 SHA-256"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = [] # {'name', 'sha256', 'crc32', 'size'}，按写入顺序
+        self._zipf = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_STORED)
+
+    def writestr(self, name, data):
+        info = zipfile.ZipInfo(name, date_time=ZIP_TIMESTAMP)
+        info.compress_type = zipfile.ZIP_STORED
+        info.create_system = 3 # 固定为 Unix，避免不同平台生成的归档字节不同
+        info.external_attr = (ZIP_FILE_MODE | 0o100000) << 16
+        self._zipf.writestr(info, data)
+        self.entries.append(_entry(name, data))
+
+    def write_file(self, source_path, name):
+        with open(source_path, "rb") as f:
+            self.writestr(name, f.read())
+
+    def close(self):
+        self._zipf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def build_manifest(archive_path, entries, extra=None, name=None):
+    """根据已写入的条目生成清单字典 (不含时间等会变化的信息)
+
+    name 为归档最终的文件名，归档先写入临时文件时传入。
+    """
+    archive_path = Path(archive_path)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'archive': {
+            'name': name or archive_path.name,
+            'size': archive_path.stat().st_size,
+            'sha256': _file_sha256(archive_path),
+        },
+        'desc': None,
+        'parts': {},
+    }
+    for entry in entries:
+        part = _part_of(entry['name'])
+        if part is None:
+            if entry['name'] == DESC_NAME:
+                manifest['desc'] = {'sha256': entry['sha256'], 'crc32': entry['crc32'], 'size': entry['size']}
+            continue
+        manifest['parts'].setdefault(part, {'sha256': None, 'frames': []})['frames'].append(dict(entry))
+    for part in manifest['parts'].values():
+        part['sha256'] = _part_digest(part['frames'])
+    manifest.update(extra or {})
+    return manifest
+
+
+def write_manifest(manifest, manifest_path):
+    """写出清单，键按名称排序、格式固定，相同内容得到相同字节"""
+    manifest_path = Path(manifest_path)
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+def manifest_from_archive(archive_path):
+    """读取已有归档的全部条目并生成清单 (用于没有清单的旧归档)"""
+    entries = []
+    with zipfile.ZipFile(archive_path) as zipf:
+        for info in zipf.infolist():
+            if info.is_dir():
+                continue
+            entries.append(_entry(info.filename, zipf.read(info)))
+    return build_manifest(archive_path, entries)
+
+
+def _manifest_entries(manifest):
+    """清单记录的条目 {条目名: (crc32, 大小)}"""
+    entries = {}
+    if manifest.get('desc'):
+        entries[DESC_NAME] = (manifest['desc']['crc32'], manifest['desc']['size'])
+    for part in manifest['parts'].values():
+        for frame in part['frames']:
+            entries[frame['name']] = (frame['crc32'], frame['size'])
+    return entries
+
+
+def _central_directory_entries(archive_path):
+    with zipfile.ZipFile(archive_path) as zipf:
+        return {info.filename: (f"{info.CRC:08x}", info.file_size)
+                for info in zipf.infolist() if not info.is_dir()}
+
+
+def load_manifest(archive_path):
+    """读取归档的清单；清单不存在、版本不符或与归档内容不一致时返回 None
+
+    除归档大小外，还逐条比较清单与 ZIP 中央目录中的条目名、CRC32 和大小
+    (只读取中央目录)，大小不变的修改 (例如 desc.txt 中帧率 30 改为 24) 也能发现。
+    """
+    try:
+        with open(manifest_path_for(archive_path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    try:
+        if manifest.get('version') != MANIFEST_VERSION or \
+           manifest['archive']['size'] != os.path.getsize(archive_path) or \
+           _manifest_entries(manifest) != _central_directory_entries(archive_path):
+            return None
+    except (KeyError, TypeError, AttributeError, OSError, zipfile.BadZipFile):
+        return None
+    return manifest
+
+
+def _summary_from_manifest(manifest):
+    frames = {}
+    for part in manifest['parts'].values():
+        for frame in part['frames']:
+            frames[frame['name']] = f"sha256:{frame['sha256']}"
+    desc = manifest.get('desc')
+    return {'desc': desc and f"sha256:{desc['sha256']}", 'frames': frames}
+
+
+def _summary_from_central_directory(archive_path):
+    """只读取 ZIP 中央目录，用 CRC32 和大小代表条目内容，不读取帧数据"""
+    frames = {}
+    desc = None
+    with zipfile.ZipFile(archive_path) as zipf:
+        for info in zipf.infolist():
+            if info.is_dir():
+                continue
+            content_id = f"crc32:{info.CRC:08x}:{info.file_size}"
+            if _part_of(info.filename) is None:
+                if info.filename == DESC_NAME:
+                    desc = content_id
+                continue
+            frames[info.filename] = content_id
+    return {'desc': desc, 'frames': frames}
+
+
+def diff_archives(old_path, new_path):
+    """比较两个归档，返回差异字典
+
+    两边都有有效清单时直接比较清单中的 SHA-256 (归档哈希相同即判定相同)；
+    否则只读取两边的 ZIP 中央目录比较 CRC32，都不需要解压帧数据。
+    """
+    old_manifest = load_manifest(old_path)
+    new_manifest = load_manifest(new_path)
+    if old_manifest and new_manifest:
+        method = "manifest"
+        if old_manifest['archive']['sha256'] == new_manifest['archive']['sha256']:
+            return {'identical': True, 'method': method, 'desc_changed': False, 'parts': {}}
+        old_summary = _summary_from_manifest(old_manifest)
+        new_summary = _summary_from_manifest(new_manifest)
+    else:
+        method = "crc32"
+        old_summary = _summary_from_central_directory(old_path)
+        new_summary = _summary_from_central_directory(new_path)
+
+    part_names = sorted(set(_part_of(name) for name in old_summary['frames']) |
+                        set(_part_of(name) for name in new_summary['frames']),
+                        key=lambda part: (len(part), part))
+    parts = {}
+    for part in part_names:
+        old_frames = {name: value for name, value in old_summary['frames'].items() if _part_of(name) == part}
+        new_frames = {name: value for name, value in new_summary['frames'].items() if _part_of(name) == part}
+        if not old_frames:
+            status = "added"
+        elif not new_frames:
+            status = "removed"
+        elif old_frames == new_frames:
+            status = "unchanged"
+        else:
+            status = "changed"
+        parts[part] = {
+            'status': status,
+            'frames': len(new_frames or old_frames),
+            'changed': sorted(name for name in old_frames.keys() & new_frames.keys()
+                              if old_frames[name] != new_frames[name]),
+            'added': sorted(new_frames.keys() - old_frames.keys()),
+            'removed': sorted(old_frames.keys() - new_frames.keys()),
+        }
+
+    desc_changed = old_summary['desc'] != new_summary['desc']
+    identical = not desc_changed and all(part['status'] == "unchanged" for part in parts.values())
+    return {'identical': identical, 'method': method, 'desc_changed': desc_changed, 'parts': parts}
+
+
+def format_diff(diff):
+    status_text = {'added': "新增", 'removed': "删除", 'unchanged': "未变化", 'changed': "已变化"}
+    method_text = "清单 SHA-256" if diff['method'] == "manifest" else "ZIP 中央目录 CRC32"
+    if diff['identical']:
+        return f"归档内容相同 (比较方式: {method_text})"
+    lines = [f"比较方式: {method_text}",
+             f"desc.txt: {'已变化' if diff['desc_changed'] else '未变化'}"]
+    for part, info in diff['parts'].items():
+        line = f"{part}: {status_text[info['status']]} ({info['frames']} 帧)"
+        if info['status'] == "changed":
+            line += f"，变化 {len(info['changed'])} 帧，新增 {len(info['added'])} 帧，删除 {len(info['removed'])} 帧"
+        lines.append(line)
+    changed_parts = [part for part, info in diff['parts'].items() if info['status'] != "unchanged"]
+    lines.append(f"变化的段落: {', '.join(changed_parts) if changed_parts else '无'}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bootanimation 归档清单与差异比较")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    diff_parser = subparsers.add_parser('diff', help="比较两个归档，内容相同时退出码为 0，不同时为 1")
+    diff_parser.add_argument('old', help="旧归档")
+    diff_parser.add_argument('new', help="新归档")
+    diff_parser.add_argument('--json', action='store_true', help="以 JSON 输出差异")
+
+    manifest_parser = subparsers.add_parser('manifest', help="为已有归档生成清单文件")
+    manifest_parser.add_argument('archive', help="归档路径")
+
+    args = parser.parse_args()
+    if args.command == 'manifest':
+        path = write_manifest(manifest_from_archive(args.archive), manifest_path_for(args.archive))
+        print(f"已写入清单: {path}")
+        return 0
+
+    diff = diff_archives(args.old, args.new)
+    if args.json:
+        print(json.dumps(diff, ensure_ascii=False, indent=2))
+    else:
+        print(format_diff(diff))
+    return 0 if diff['identical'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
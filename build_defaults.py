@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+构建和分析的默认参数
+
+只包含常量，不依赖 Pillow/numpy，图形界面启动时即可导入来填充控件，
+编码和分析模块在首次使用时才加载。
+"""
+
+DEFAULT_JPEG_QUALITY = 95
+
+# 近似帧分析的指标名称 -> (默认阈值, 说明)
+METRICS = {
+    'mae': (1.0, "分块平均绝对误差的最大值 (灰度级 0-255)，小于等于阈值视为近似帧"),
+    'ssim': (0.98, "分块结构相似度的最小值 (0-1)，大于等于阈值视为近似帧"),
+}
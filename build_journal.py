@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+构建检查点日志 - 记录已完成编码的帧，使中断或崩溃的构建可以从断点继续
+
+编码结果按帧键 (源文件路径、修改时间、大小与编码参数的哈希) 存放在
+临时目录的 frames/ 下，每完成一帧向 journal.jsonl 追加一行并落盘。
+源文件被修改后帧键随之变化，旧的编码结果自然失效。
+
+也可以把编码结果放在多个构建共享的缓存目录中 (例如构建服务)，此时
+缓存中已存在的帧可直接复用，清理时不会删除共享文件。
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+JOURNAL_NAME = "journal.jsonl"
+FRAMES_DIR_NAME = "frames"
+
+
+def frame_key(source_path, save_format, quality, backend=None):
+    """根据源文件状态和编码参数计算帧键
+
+    不同编码后端的输出字节不同，非默认后端 (Pillow) 也计入帧键；
+    使用 Pillow 时帧键与旧版本保持一致，已有缓存仍然有效。
+    """
+    path = os.path.abspath(source_path)
+    stat = os.stat(path)
+    raw = f"{path}|{stat.st_mtime_ns}|{stat.st_size}|{save_format}|{quality}"
+    if backend and backend != "pillow":
+        raw += f"|{backend}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class BuildJournal:
+    """临时目录中的检查点日志"""
+
+    def __init__(self, temp_dir, shared_frames_dir=None):
+        self.temp_dir = Path(temp_dir)
+        self.shared = shared_frames_dir is not None
+        self.frames_dir = Path(shared_frames_dir) if self.shared else self.temp_dir / FRAMES_DIR_NAME
+        self.journal_path = self.temp_dir / JOURNAL_NAME
+        self.entries = {} # 帧键 -> 编码文件路径
+        self._journal_file = None
+
+    def open(self):
+        """创建目录并读取已有日志，返回可复用的帧数"""
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.frames_dir.mkdir(parents=True, exist_ok=True)
+        self.entries = {}
+        if self.journal_path.exists():
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时最后一行可能只写了一半
+                        continue
+                    encoded_path = self.temp_dir / record['file']
+                    try:
+                        if encoded_path.stat().st_size == record['size']:
+                            self.entries[record['key']] = encoded_path
+                    except OSError:
+                        continue
+        self._journal_file = open(self.journal_path, "a", encoding="utf-8")
+        return len(self.entries)
+
+    def close(self):
+        if self._journal_file:
+            self._journal_file.close()
+            self._journal_file = None
+
+    def lookup(self, key, extension=None):
+        """返回帧键对应的已编码文件，不存在时返回 None"""
+        encoded_path = self.entries.get(key)
+        if encoded_path is None and self.shared and extension:
+            # 共享缓存中的文件都是先写临时文件再改名的，存在即完整
+            candidate = self.frame_path(key, extension)
+            if candidate.exists():
+                return candidate
+        return encoded_path
+
+    def frame_path(self, key, extension):
+        """帧键对应的编码文件路径"""
+        return self.frames_dir / f"{key}.{extension}"
+
+    def _make_record(self, key, encoded_path):
+        if self.shared:
+            file_name = encoded_path.resolve().as_posix()
+        else:
+            file_name = encoded_path.relative_to(self.temp_dir).as_posix()
+        return {
+            'key': key,
+            'file': file_name,
+            'size': encoded_path.stat().st_size,
+        }
+
+    def record(self, key, encoded_path):
+        """记录一帧已完成编码并立即落盘"""
+        encoded_path = Path(encoded_path)
+        self._journal_file.write(json.dumps(self._make_record(key, encoded_path)) + "\n")
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+        self.entries[key] = encoded_path
+
+    def compact(self, keep_paths):
+        """只保留 keep_paths 中的编码结果，删除其余文件并重写日志
+
+        用于保留缓存的增量构建，避免源文件反复修改后缓存无限增长。
+        """
+        keep_paths = set(Path(path) for path in keep_paths)
+        self.entries = {key: path for key, path in self.entries.items() if path in keep_paths}
+        for path in ([] if self.shared else self.frames_dir.iterdir()):
+            if path not in keep_paths:
+                try:
+                    path.unlink()
+                except OSError as e:
+                    print(f"清理缓存文件 {path} 时出错: {e}")
+
+        self.close()
+        tmp_journal_path = self.journal_path.with_name(JOURNAL_NAME + ".tmp")
+        with open(tmp_journal_path, "w", encoding="utf-8") as f:
+            for key, path in self.entries.items():
+                f.write(json.dumps(self._make_record(key, path)) + "\n")
+        os.replace(tmp_journal_path, self.journal_path)
+        self._journal_file = open(self.journal_path, "a", encoding="utf-8")
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+构建服务 - 常驻的 asyncio 构建守护进程，通过本地 HTTP 或 Unix socket 提供任务接口
+
+用法:
+    python build_service.py --port 8765
+    python build_service.py --unix /tmp/bootanimation.sock
+
+接口:
+    POST   /jobs                  提交构建 (JSON 构建描述)，返回任务信息
+    GET    /jobs                  列出所有任务
+    GET    /jobs/<id>             查询任务状态和进度
+    GET    /jobs/<id>/events?since=N  获取序号大于 N 的进度事件
+    GET    /jobs/<id>/archive     下载生成的 bootanimation.zip
+    GET    /jobs/<id>/manifest    下载归档清单 (每帧、每段的 SHA-256)
+    DELETE /jobs/<id>             取消任务 (已结束的任务则删除其文件)
+
+构建描述示例:
+    {
+        "fps": 30, "source_fps": 60, "quality": 90, "device": "小米设备", "encoder_backend": "pillow",
+        "segments": [
+            {"dir": "/frames/intro", "loop": 1, "pause": 0},
+            {"frames": ["/frames/loop/0001.png", "/frames/loop/0002.png"], "loop": 0}
+        ]
+    }
+
+所有任务共享同一个常驻进程池编码帧 (进程只启动一次，Pillow 保持已加载)，
+编码结果存放在共享的帧缓存中，不同任务之间可以直接复用。服务不依赖 Qt。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+import animation_builder
+import archive_manifest
+import config_examples
+import encoder_backends
+import frame_encoder
+
+DEFAULT_PORT = 8765
+DEFAULT_DATA_DIR = "build_service_data"
+DEFAULT_MAX_JOBS = 2
+DEFAULT_CACHE_LIMIT = 2 * 1024 * 1024 * 1024
+MAX_REQUEST_BODY = 16 * 1024 * 1024
+# 编码进程异常退出后，重建进程池并重试任务的次数 (已编码的帧保存在缓存中，不会重复编码)
+POOL_RESTART_RETRIES = 1
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+_HTTP_REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+class SpecError(ValueError):
+    """构建描述无效"""
+
+
+def _warm_worker():
+    """进程池工作进程的初始化：预先加载 Pillow 插件，后续任务无需再付出导入开销"""
+    # fork 出的进程继承了服务事件循环的 SIGTERM 处理；恢复默认处理，
+    # 进程池损坏时 ProcessPoolExecutor 才能用 terminate() 结束剩余的工作进程
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.set_wakeup_fd(-1)
+    from PIL import Image
+    Image.init()
+
+
+def _source_format(path):
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.jpg', '.jpeg'):
+        return "JPEG"
+    return suffix.lstrip('.').upper()
+
+
+def _list_images(directory):
+    """目录中的图片，按文件名排序"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        raise SpecError(f"目录不存在: {directory}")
+    return [str(path) for path in sorted(directory.iterdir(), key=lambda p: p.name)
+            if path.suffix.lower() in SOURCE_EXTENSIONS and path.is_file()]
+
+
+def _check_int(name, value, low, high=None):
+    """检查整数参数的范围；JSON 中的 true/false 在 Python 中是 int，需要单独排除"""
+    if isinstance(value, bool) or not isinstance(value, int) or value < low or (high is not None and value > high):
+        if high is None:
+            raise SpecError(f"{name} 必须是大于等于 {low} 的整数")
+        raise SpecError(f"{name} 必须是 {low}-{high} 之间的整数")
+    return value
+
+
+def parse_build_request(request, output_path, cache_dir):
+    """把 JSON 构建描述转换为 (BuildSpec, 警告列表)"""
+    if not isinstance(request, dict):
+        raise SpecError("构建描述必须是 JSON 对象")
+    segments = request.get('segments')
+    if not isinstance(segments, list) or not segments:
+        raise SpecError("segments 不能为空")
+
+    device = request.get('device')
+    device_config = None
+    if device is not None:
+        device_config = config_examples.DEVICE_CONFIGS.get(device)
+        if device_config is None:
+            raise SpecError(f"未知的设备: {device}，可选: {', '.join(config_examples.DEVICE_CONFIGS)}")
+
+    fps = request.get('fps')
+    if fps is None:
+        fps = device_config['fps'] if device_config else 30
+    source_fps = request.get('source_fps')
+    quality = request.get('quality', frame_encoder.DEFAULT_JPEG_QUALITY)
+    for name, value, low, high in (('fps', fps, 1, 120), ('source_fps', source_fps, 1, 240),
+                                   ('quality', quality, 1, 100)):
+        if value is not None:
+            _check_int(name, value, low, high)
+
+    # 默认固定为 Pillow：同一构建描述在任何机器上得到相同的字节；
+    # "auto" 按本机基准测试选择后端，更快但输出随机器不同
+    encoder_backend = request.get('encoder_backend', encoder_backends.DEFAULT_BACKEND)
+    if encoder_backend != encoder_backends.AUTO_BACKEND and encoder_backend not in encoder_backends.BACKENDS:
+        raise SpecError(f"未知的编码后端: {encoder_backend}，可选: auto, {', '.join(encoder_backends.BACKENDS)}")
+
+    frames = []
+    segment_params = []
+    for seg_idx, segment in enumerate(segments):
+        if not isinstance(segment, dict):
+            raise SpecError(f"segments[{seg_idx}] 必须是 JSON 对象")
+        if 'frames' in segment:
+            paths = segment['frames']
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                raise SpecError(f"segments[{seg_idx}].frames 必须是路径列表")
+        elif 'dir' in segment:
+            paths = _list_images(segment['dir'])
+        else:
+            raise SpecError(f"segments[{seg_idx}] 需要 frames 或 dir")
+        if not paths:
+            raise SpecError(f"segments[{seg_idx}] 没有图片")
+        frames.extend(animation_builder.FrameSpec(str(p), _source_format(p), seg_idx) for p in paths)
+        # 与界面默认值一致：最后一段无限循环，其余段落播放一次
+        default_loop = 0 if seg_idx == len(segments) - 1 else 1
+        segment_params.append(animation_builder.SegmentParams(
+            _check_int(f"segments[{seg_idx}].loop", segment.get('loop', default_loop), 0),
+            _check_int(f"segments[{seg_idx}].pause", segment.get('pause', 0), 0)
+        ))
+
+    warnings = []
+    if device_config:
+        resolution = device_config['resolution']
+        try:
+            with Image.open(frames[0].path) as first_image:
+                frame_size = first_image.size
+        except OSError:
+            frame_size = None
+        if frame_size is not None:
+            if frame_size != resolution:
+                warnings.append(f"图片尺寸 {frame_size[0]}x{frame_size[1]} 与{device}分辨率 "
+                                f"{resolution[0]}x{resolution[1]} 不一致")
+            resolution = frame_size
+        setting_warnings, setting_errors = config_examples.validate_settings(
+            fps, segment_params[-1].loop, len(frames), resolution
+        )
+        warnings.extend(setting_warnings)
+        if setting_errors:
+            raise SpecError("；".join(setting_errors))
+
+    spec = animation_builder.BuildSpec(
+        tuple(frames), str(output_path), fps, tuple(segment_params), source_fps, quality,
+        keep_cache=False, cache_dir=str(cache_dir), encoder_backend=encoder_backend
+    )
+    return spec, warnings
+
+
+class BuildService:
+    """构建任务管理：共享进程池、共享帧缓存和任务状态"""
+
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, workers=None, max_jobs=DEFAULT_MAX_JOBS,
+                 cache_limit=DEFAULT_CACHE_LIMIT):
+        self.data_dir = Path(data_dir).resolve()
+        self.jobs_dir = self.data_dir / "jobs"
+        self.cache_dir = self.data_dir / "frame_cache"
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers or animation_builder.default_worker_count()
+        self.max_jobs = max_jobs
+        self.cache_limit = cache_limit
+        self.jobs = {}
+        self._process_pool = None
+        self._pool_lock = None
+        self._coordinators = None
+        self._job_slots = None
+        self._pruning = False
+        self._loop = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._job_slots = asyncio.Semaphore(self.max_jobs)
+        self._pool_lock = asyncio.Lock()
+        # 每个任务的协调逻辑 (提交编码、写 ZIP) 在线程中运行，编码本身在进程池中
+        self._coordinators = ThreadPoolExecutor(max_workers=self.max_jobs)
+        self._process_pool = await self._create_process_pool()
+
+    async def _create_process_pool(self):
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        # 提前启动全部工作进程，第一个任务不再承担进程启动开销
+        await asyncio.gather(*(self._loop.run_in_executor(pool, _warm_worker)
+                               for _ in range(self.workers)))
+        return pool
+
+    async def _replace_process_pool(self, broken_pool):
+        """编码进程异常退出 (例如内存不足被杀死) 后进程池不再可用，创建新的进程池
+
+        同时运行的多个任务都会遇到同一个损坏的进程池，只有第一个任务负责重建。
+        """
+        async with self._pool_lock:
+            if self._process_pool is not broken_pool:
+                return
+            print("警告: 编码进程异常退出，正在重新创建进程池")
+            broken_pool.shutdown(wait=False)
+            self._process_pool = await self._create_process_pool()
+
+    def shutdown(self):
+        for job in self.jobs.values():
+            job['cancel_event'].set()
+        if self._coordinators:
+            self._coordinators.shutdown(wait=True)
+        if self._process_pool:
+            self._process_pool.shutdown(wait=True)
+
+    def _add_event(self, job, event_type, **fields):
+        event = dict(fields, seq=len(job['events']) + 1, time=time.time(), type=event_type)
+        job['events'].append(event)
+
+    def job_info(self, job):
+        info = {key: job[key] for key in ('id', 'status', 'created', 'progress', 'frames_per_second',
+                                          'warnings', 'result', 'error')}
+        info['events'] = len(job['events'])
+        return info
+
+    def submit(self, request):
+        """提交构建描述，返回任务；描述无效时抛出 SpecError"""
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = self.jobs_dir / job_id
+        if not isinstance(request, dict):
+            raise SpecError("构建描述必须是 JSON 对象")
+        output_name = request.get('output_name', "bootanimation.zip")
+        if not isinstance(output_name, str) or Path(output_name).name != output_name or not output_name.endswith(".zip"):
+            raise SpecError("output_name 必须是 .zip 文件名")
+        spec, warnings = parse_build_request(request, job_dir / output_name, self.cache_dir)
+        job_dir.mkdir(parents=True)
+
+        job = {
+            'id': job_id,
+            'status': "queued",
+            'created': time.time(),
+            'progress': 0,
+            'frames_per_second': 0.0,
+            'warnings': warnings,
+            'result': None,
+            'error': None,
+            'events': [],
+            'spec': spec,
+            'dir': job_dir,
+            'cancel_event': threading.Event(),
+        }
+        self.jobs[job_id] = job
+        self._add_event(job, "queued", frames=len(spec.frames))
+        for warning in warnings:
+            self._add_event(job, "warning", message=warning)
+        asyncio.ensure_future(self._run_job(job))
+        return job
+
+    def cancel(self, job):
+        """取消排队中或进行中的任务；已结束的任务删除其文件"""
+        if job['status'] in ("queued", "running"):
+            job['cancel_event'].set()
+            return
+        shutil.rmtree(job['dir'], ignore_errors=True)
+        del self.jobs[job['id']]
+
+    def _on_progress(self, job, percent, frames_per_second):
+        if frames_per_second:
+            job['frames_per_second'] = round(frames_per_second, 1)
+        if percent != job['progress']:
+            job['progress'] = percent
+            self._add_event(job, "progress", progress=percent, frames_per_second=job['frames_per_second'])
+
+    def _build(self, job, process_pool):
+        """在协调线程中运行构建"""
+        return animation_builder.build_animation(
+            job['spec'], process_pool,
+            progress_callback=lambda percent, fps: self._loop.call_soon_threadsafe(
+                self._on_progress, job, percent, fps),
+            is_cancelled=job['cancel_event'].is_set,
+            max_in_flight=self.workers * 2
+        )
+
+    async def _run_job(self, job):
+        async with self._job_slots:
+            if job['cancel_event'].is_set():
+                job['status'] = "cancelled"
+                self._add_event(job, "cancelled", message="任务在开始前被取消")
+                return
+            job['status'] = "running"
+            self._add_event(job, "started")
+            try:
+                result = await self._build_with_restart(job)
+            except animation_builder.BuildCancelled as e:
+                job['status'] = "cancelled"
+                self._add_event(job, "cancelled", message=str(e))
+            except animation_builder.BuildError as e:
+                job['status'] = "failed"
+                job['error'] = str(e)
+                self._add_event(job, "failed", message=str(e))
+            except BrokenProcessPool as e:
+                job['status'] = "failed"
+                job['error'] = f"编码进程反复异常退出 (可能内存不足)，已放弃该任务: {e}"
+                self._add_event(job, "failed", message=job['error'])
+            except Exception as e:
+                job['status'] = "failed"
+                job['error'] = f"构建时发生严重错误: {e}"
+                self._add_event(job, "failed", message=job['error'])
+            else:
+                result['output_path'] = Path(result['output_path']).name
+                result['manifest_path'] = Path(result['manifest_path']).name
+                job['status'] = "succeeded"
+                job['progress'] = 100
+                job['result'] = result
+                self._add_event(job, "finished", **result)
+        if not any(j['status'] in ("queued", "running") for j in self.jobs.values()):
+            asyncio.ensure_future(self._prune_when_idle())
+
+    async def _build_with_restart(self, job):
+        """运行构建；进程池损坏时重建进程池并重试，重试用尽后抛出 BrokenProcessPool"""
+        restarts = 0
+        while True:
+            process_pool = self._process_pool
+            try:
+                return await self._loop.run_in_executor(self._coordinators, self._build, job, process_pool)
+            except BrokenProcessPool as e:
+                await self._replace_process_pool(process_pool)
+                if restarts >= POOL_RESTART_RETRIES or job['cancel_event'].is_set():
+                    raise
+                restarts += 1
+                self._add_event(job, "retrying", message=f"编码进程异常退出，已重建进程池并重试: {e}")
+
+    async def _prune_when_idle(self):
+        """占用全部任务槽后清理缓存，清理期间不会有构建在读取共享缓存"""
+        if self._pruning:
+            return
+        self._pruning = True
+        acquired = 0
+        try:
+            for _ in range(self.max_jobs):
+                await self._job_slots.acquire()
+                acquired += 1
+            await self._loop.run_in_executor(None, self.prune_cache)
+        finally:
+            for _ in range(acquired):
+                self._job_slots.release()
+            self._pruning = False
+
+    def prune_cache(self):
+        """共享帧缓存超过上限时按最近访问时间删除旧文件 (必须在占用全部任务槽时调用)"""
+        entries = []
+        total = 0
+        for path in self.cache_dir.iterdir():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+            total += stat.st_size
+        if total <= self.cache_limit:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            if total <= self.cache_limit:
+                break
+
+
+class ServiceHTTPServer:
+    """最小化的 HTTP/1.1 服务端，每个请求处理完后关闭连接"""
+
+    def __init__(self, service):
+        self.service = service
+
+    async def handle_connection(self, reader, writer):
+        try:
+            try:
+                method, target, body = await self._read_request(reader)
+            except ValueError as e:
+                status = 413 if "过大" in str(e) else 400
+                await self._send_json(writer, status, {'error': str(e)})
+                return
+            await self._dispatch(writer, method, target, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            await self._send_json(writer, 500, {'error': str(e)})
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        parts = request_line.split(' ')
+        if len(parts) != 3:
+            raise ValueError("无效的请求行")
+        method, target, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0) or 0)
+        if length > MAX_REQUEST_BODY:
+            raise ValueError("请求体过大")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, body
+
+    async def _dispatch(self, writer, method, target, body):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        service = self.service
+
+        if parts == ['jobs']:
+            if method == 'GET':
+                await self._send_json(writer, 200, {'jobs': [service.job_info(job) for job in service.jobs.values()]})
+            elif method == 'POST':
+                try:
+                    request = json.loads(body.decode('utf-8'))
+                    job = service.submit(request)
+                except (ValueError, SpecError) as e:
+                    await self._send_json(writer, 400, {'error': str(e)})
+                    return
+                await self._send_json(writer, 201, service.job_info(job))
+            else:
+                await self._send_json(writer, 405, {'error': "不支持的方法"})
+            return
+
+        if len(parts) < 2 or parts[0] != 'jobs' or parts[1] not in service.jobs:
+            await self._send_json(writer, 404, {'error': "任务不存在"})
+            return
+        job = service.jobs[parts[1]]
+        sub_resource = parts[2] if len(parts) > 2 else None
+
+        if sub_resource is None and method == 'GET':
+            await self._send_json(writer, 200, service.job_info(job))
+        elif sub_resource is None and method == 'DELETE':
+            service.cancel(job)
+            await self._send_json(writer, 200, {'id': job['id'], 'status': job['status']})
+        elif sub_resource == 'events' and method == 'GET':
+            try:
+                since = max(0, int(parse_qs(url.query).get('since', ['0'])[0]))
+            except ValueError:
+                await self._send_json(writer, 400, {'error': "since 必须是整数"})
+                return
+            await self._send_json(writer, 200, {'events': job['events'][since:]})
+        elif sub_resource == 'archive' and method == 'GET':
+            if job['status'] != "succeeded":
+                await self._send_json(writer, 409, {'error': f"任务尚未成功完成 (当前状态: {job['status']})"})
+                return
+            await self._send_file(writer, Path(job['spec'].output_path))
+        elif sub_resource == 'manifest' and method == 'GET':
+            if job['status'] != "succeeded":
+                await self._send_json(writer, 409, {'error': f"任务尚未成功完成 (当前状态: {job['status']})"})
+                return
+            await self._send_file(writer, archive_manifest.manifest_path_for(job['spec'].output_path),
+                                  "application/json; charset=utf-8")
+        else:
+            await self._send_json(writer, 404, {'error': "接口不存在"})
+
+    async def _send_headers(self, writer, status, content_type, length, extra_headers=()):
+        lines = [f"HTTP/1.1 {status} {_HTTP_REASONS.get(status, '')}",
+                 f"Content-Type: {content_type}",
+                 f"Content-Length: {length}",
+                 "Connection: close"]
+        lines.extend(extra_headers)
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('utf-8'))
+
+    async def _send_json(self, writer, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await self._send_headers(writer, status, "application/json; charset=utf-8", len(body))
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_file(self, writer, path, content_type="application/zip"):
+        size = path.stat().st_size
+        await self._send_headers(writer, 200, content_type, size,
+                                 [f'Content-Disposition: attachment; filename="{path.name}"'])
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+
+async def run_service(args):
+    service = BuildService(args.data_dir, args.workers, args.max_jobs, args.cache_limit * 1024 * 1024)
+    await service.start()
+    http = ServiceHTTPServer(service)
+    if args.unix:
+        server = await asyncio.start_unix_server(http.handle_connection, path=args.unix)
+        address = args.unix
+    else:
+        server = await asyncio.start_server(http.handle_connection, args.host, args.port)
+        address = f"http://{args.host}:{server.sockets[0].getsockname()[1]}"
+    print(f"构建服务已启动: {address} (编码进程 {service.workers} 个，并行任务 {service.max_jobs} 个)", flush=True)
+    serve_task = asyncio.ensure_future(server.serve_forever())
+    try:
+        # 收到 SIGTERM 时也正常退出，关闭进程池并删除 socket 文件
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serve_task.cancel)
+    except (NotImplementedError, AttributeError):
+        pass
+    try:
+        await serve_task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        server.close()
+        service.shutdown()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bootanimation 构建服务")
+    parser.add_argument('--host', default='127.0.0.1', help="HTTP 监听地址")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="HTTP 监听端口，0 表示自动分配")
+    parser.add_argument('--unix', help="改为监听 Unix socket 路径")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="任务输出和帧缓存目录")
+    parser.add_argument('--workers', type=int, default=None, help="编码进程数，默认等于 CPU 核数")
+    parser.add_argument('--max-jobs', type=int, default=DEFAULT_MAX_JOBS, help="同时运行的任务数")
+    parser.add_argument('--cache-limit', type=int, default=DEFAULT_CACHE_LIMIT // (1024 * 1024),
+                        help="共享帧缓存上限 (MB)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_service(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分布式编码节点 - 通过 TCP 接收帧编码任务 (源图片字节 + 参数) 并返回编码结果
+
+用法:
+    python encode_worker.py serve --host 0.0.0.0 --port 9100
+    python encode_worker.py bench --workers 192.168.1.10:9100,192.168.1.11:9100 图片...
+    python encode_worker.py bench --local 4 图片...
+
+协议: 每条消息为 4 字节大端 JSON 头长度 + JSON 头 + 负载字节，负载长度记录在
+头部的 length 字段中。一个连接上可以连续发送多个请求。
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import frame_encoder
+
+DEFAULT_PORT = 9100
+MAX_MESSAGE_SIZE = 512 * 1024 * 1024
+_HEADER_LENGTH = struct.Struct('>I')
+
+
+class RemoteWorkerError(Exception):
+    """编码节点返回的错误 (例如源图片损坏)，重试也不会成功"""
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock, header, payload=b""):
+    """发送一条消息
+
+    头部和负载合并为一次 sendall，避免 Nagle 算法与延迟确认叠加造成的等待。
+    """
+    raw_header = json.dumps(dict(header, length=len(payload))).encode('utf-8')
+    sock.sendall(b"".join((_HEADER_LENGTH.pack(len(raw_header)), raw_header, payload)))
+
+
+def set_nodelay(sock):
+    """关闭 Nagle 算法：请求/应答都是小消息往返，不能等待合并"""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def recv_message(sock):
+    """接收一条消息，返回 (头部字典, 负载字节)"""
+    (header_length,) = _HEADER_LENGTH.unpack(_recv_exact(sock, _HEADER_LENGTH.size))
+    if header_length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"消息头过大: {header_length}")
+    header = json.loads(_recv_exact(sock, header_length).decode('utf-8'))
+    payload_length = header.get('length', 0)
+    if payload_length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"消息过大: {payload_length}")
+    payload = _recv_exact(sock, payload_length) if payload_length else b""
+    return header, payload
+
+
+class EncodeRequestHandler(socketserver.BaseRequestHandler):
+    """处理一个连接上的连续编码请求"""
+
+    def handle(self):
+        set_nodelay(self.request)
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            except ValueError as e:
+                send_message(self.request, {'ok': False, 'error': str(e)})
+                return
+
+            op = header.get('op')
+            if op == 'ping':
+                send_message(self.request, {'ok': True, 'cpu_count': os.cpu_count() or 1})
+            elif op == 'encode':
+                try:
+                    data, used_backend = frame_encoder.encode_image_bytes(
+                        payload, header['format'], header['quality'], header.get('backend'))
+                except Exception as e:
+                    send_message(self.request, {'ok': False, 'error': f"编码失败: {e}"})
+                else:
+                    send_message(self.request, {'ok': True, 'backend': used_backend}, data)
+            else:
+                send_message(self.request, {'ok': False, 'error': f"未知操作: {op}"})
+
+
+class EncodeWorkerServer(socketserver.ThreadingTCPServer):
+    """编码节点，每个连接一个线程；Pillow 编码时释放 GIL，可利用多核"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(host, port):
+    """启动编码节点并一直运行"""
+    with EncodeWorkerServer((host, port), EncodeRequestHandler) as server:
+        # 端口为 0 时由系统分配，第一行输出实际端口供 bench --local 读取
+        print(f"LISTENING {server.server_address[1]}", flush=True)
+        server.serve_forever()
+
+
+def parse_addresses(text):
+    """解析 "host:port, host:port" 形式的节点列表"""
+    addresses = []
+    for item in text.replace(';', ',').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(':')
+        if not host:
+            host, port = item, DEFAULT_PORT
+        addresses.append((host, int(port)))
+    return addresses
+
+
+class RemoteEncoderPool:
+    """把帧编码任务分发到多个编码节点
+
+    所有任务进入同一队列，每个节点保持 connections_per_worker 个连接，
+    每个连接空闲时取下一帧，快的节点自然分到更多帧。网络错误时断开
+    该连接并把任务放回队列交给其他节点重试，出错的节点按指数退避暂停
+    接收任务；超过 max_attempts 次后在本机编码，保证构建不会因节点故障而丢帧。
+    """
+
+    def __init__(self, addresses, connections_per_worker=2, max_attempts=3, timeout=60.0,
+                 retry_delay=1.0, local_fallback=True):
+        if not addresses:
+            raise ValueError("至少需要一个编码节点")
+        self.addresses = list(addresses)
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.local_fallback = local_fallback
+        self.stats = {address: {'frames': 0, 'bytes_sent': 0, 'failures': 0} for address in self.addresses}
+        self._stats_lock = threading.Lock()
+        self._down_until = {address: 0.0 for address in self.addresses}
+        self._consecutive_failures = {address: 0 for address in self.addresses}
+        self._stopping = threading.Event()
+        self._tasks = queue.Queue()
+        self._threads = []
+        for address in self.addresses:
+            for _ in range(connections_per_worker):
+                thread = threading.Thread(target=self._connection_loop, args=(address,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    @property
+    def worker_count(self):
+        """并发连接数，构建时据此决定在途任务数"""
+        return len(self._threads)
+
+    def submit_encode(self, source_path, save_format, quality, dest_path, backend=None):
+        """提交一帧编码任务，返回 Future，结果为 (dest_path, 实际使用的后端名称)
+
+        backend 为编码后端名称，节点上没有该后端时节点改用 Pillow 并在应答中说明。
+        """
+        future = Future()
+        self._tasks.put((future, str(source_path), save_format, quality, dest_path, backend, 0))
+        return future
+
+    def shutdown(self, wait=True):
+        """停止所有连接线程"""
+        self._stopping.set()
+        for _ in self._threads:
+            self._tasks.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _mark_failed(self, address):
+        with self._stats_lock:
+            self.stats[address]['failures'] += 1
+            self._consecutive_failures[address] += 1
+            backoff = min(self.retry_delay * 2 ** (self._consecutive_failures[address] - 1), 30.0)
+            self._down_until[address] = time.monotonic() + backoff
+
+    def _mark_succeeded(self, address, bytes_sent):
+        with self._stats_lock:
+            self.stats[address]['frames'] += 1
+            self.stats[address]['bytes_sent'] += bytes_sent
+            self._consecutive_failures[address] = 0
+
+    def _connection_loop(self, address):
+        sock = None
+        while True:
+            # 节点出错后暂停接收任务，让其他节点处理队列
+            with self._stats_lock:
+                pause = self._down_until[address] - time.monotonic()
+            if pause > 0:
+                self._stopping.wait(pause)
+            task = self._tasks.get()
+            if task is None:
+                break
+            future, source_path, save_format, quality, dest_path, backend, attempts = task
+            if attempts == 0 and not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                with open(source_path, "rb") as f:
+                    data = f.read()
+            except OSError as e:
+                future.set_exception(e)
+                continue
+
+            try:
+                if sock is None:
+                    sock = socket.create_connection(address, timeout=self.timeout)
+                    set_nodelay(sock)
+                request = {'op': 'encode', 'format': save_format, 'quality': quality, 'backend': backend}
+                send_message(sock, request, data)
+                header, payload = recv_message(sock)
+            except (OSError, ValueError) as e:
+                if sock is not None:
+                    sock.close()
+                    sock = None
+                self._mark_failed(address)
+                self._retry(task, address, e)
+                continue
+
+            if not header.get('ok'):
+                future.set_exception(RemoteWorkerError(header.get('error', "未知错误")))
+                continue
+            try:
+                frame_encoder.write_frame_bytes(payload, dest_path)
+            except OSError as e:
+                future.set_exception(e)
+                continue
+            self._mark_succeeded(address, len(data))
+            # 旧版本节点不返回后端，只会使用 Pillow
+            future.set_result((dest_path, header.get('backend', "pillow")))
+
+        if sock is not None:
+            sock.close()
+
+    def _retry(self, task, address, error):
+        future, source_path, save_format, quality, dest_path, backend, attempts = task
+        if attempts + 1 < self.max_attempts:
+            self._tasks.put((future, source_path, save_format, quality, dest_path, backend, attempts + 1))
+            return
+        if not self.local_fallback:
+            future.set_exception(ConnectionError(f"编码节点 {address[0]}:{address[1]} 不可用: {error}"))
+            return
+        print(f"警告: 帧 {source_path} 远程编码失败 {self.max_attempts} 次，改为本机编码")
+        try:
+            future.set_result(frame_encoder.encode_frame(source_path, save_format, quality, dest_path, backend))
+        except Exception as e:
+            future.set_exception(e)
+
+
+def spawn_local_workers(count):
+    """在本机启动 count 个编码节点子进程，返回 (进程列表, 地址列表)"""
+    processes = []
+    addresses = []
+    script = str(Path(__file__).resolve())
+    for _ in range(count):
+        process = subprocess.Popen(
+            [sys.executable, script, 'serve', '--host', '127.0.0.1', '--port', '0'],
+            stdout=subprocess.PIPE, universal_newlines=True
+        )
+        line = process.stdout.readline().split()
+        if len(line) != 2 or line[0] != "LISTENING":
+            process.kill()
+            raise RuntimeError("编码节点启动失败")
+        processes.append(process)
+        addresses.append(('127.0.0.1', int(line[1])))
+    return processes, addresses
+
+
+def benchmark(addresses, image_paths, connections_per_worker=2, quality=frame_encoder.DEFAULT_JPEG_QUALITY):
+    """依次使用 1..N 个节点编码同一批帧，返回每种节点数的吞吐量"""
+    results = []
+    for worker_count in range(1, len(addresses) + 1):
+        pool = RemoteEncoderPool(addresses[:worker_count], connections_per_worker=connections_per_worker)
+        with tempfile.TemporaryDirectory() as out_dir:
+            start = time.perf_counter()
+            futures = []
+            for i, path in enumerate(image_paths):
+                save_format, extension = frame_encoder.output_format(Path(path).suffix.lstrip('.'))
+                futures.append(pool.submit_encode(path, save_format, quality,
+                                                  os.path.join(out_dir, f"{i:05d}.{extension}")))
+            for future in futures:
+                future.result()
+            elapsed = time.perf_counter() - start
+        pool.shutdown()
+        results.append({
+            'workers': worker_count,
+            'elapsed': elapsed,
+            'frames_per_second': len(image_paths) / elapsed if elapsed > 0 else 0.0,
+        })
+    return results
+
+
+def format_benchmark(results, frame_count):
+    lines = [f"编码 {frame_count} 帧:", "节点数    耗时(秒)    帧/秒    加速比"]
+    baseline = results[0]['frames_per_second'] if results else 0
+    for result in results:
+        speedup = result['frames_per_second'] / baseline if baseline else 0
+        lines.append(f"{result['workers']:>6}    {result['elapsed']:>8.2f}    "
+                     f"{result['frames_per_second']:>6.1f}    {speedup:>5.2f}x")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bootanimation 分布式编码节点")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    serve_parser = subparsers.add_parser('serve', help="启动编码节点")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="监听地址，跨机器使用时设为 0.0.0.0")
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="监听端口，0 表示自动分配")
+
+    bench_parser = subparsers.add_parser('bench', help="测试吞吐量随节点数的变化")
+    target = bench_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--workers', help="节点列表，例如 host1:9100,host2:9100")
+    target.add_argument('--local', type=int, help="在本机启动指定数量的节点")
+    bench_parser.add_argument('--connections', type=int, default=2, help="每个节点的并发连接数")
+    bench_parser.add_argument('images', nargs='+', help="用于测试的源图片")
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        try:
+            serve(args.host, args.port)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    processes = []
+    try:
+        if args.local:
+            processes, addresses = spawn_local_workers(args.local)
+        else:
+            addresses = parse_addresses(args.workers)
+        results = benchmark(addresses, args.images, args.connections)
+        print(format_benchmark(results, len(args.images)))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编码后端 - 把已准备好的 Pillow 图片编码为 PNG/JPEG 字节
+
+默认使用 Pillow；运行时检测本机安装的其他编码器 (OpenCV imencode、cjpeg、oxipng)，
+通过微基准测试为每种格式选出最快的后端。选择结果按本机环境缓存，
+环境变化 (例如新装或升级了编码器) 后自动重新测试。
+基准测试中输出无法被 Pillow 按原格式和尺寸解码的后端不会被选中。
+
+用法:
+    python encoder_backends.py            查看可用后端和当前选择
+    python encoder_backends.py --rebench  重新运行基准测试
+"""
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from PIL import Image
+
+DEFAULT_BACKEND = "pillow"
+AUTO_BACKEND = "auto"
+BENCHMARK_SIZE = (540, 960)
+BENCHMARK_REPEAT = 3
+BENCHMARK_QUALITY = 95
+CACHE_FILE_NAME = "encoder_backends.json"
+# 其他后端至少比 Pillow 快 10% 才会被选中，避免测量噪声导致选择来回变化
+SELECTION_MARGIN = 0.9
+
+_SIGNATURES = {"PNG": b"\x89PNG\r\n\x1a\n", "JPEG": b"\xff\xd8\xff"}
+
+
+class EncoderBackend:
+    """编码后端基类"""
+    name = None
+    formats = () # 支持的保存格式
+
+    def available(self):
+        return True
+
+    def version(self):
+        return ""
+
+    def encode(self, img, save_format, quality):
+        """编码图片，返回 PNG/JPEG 字节；img 已按保存格式准备好 (JPEG 时为 RGB 或 L)"""
+        raise NotImplementedError
+
+
+class PillowBackend(EncoderBackend):
+    name = "pillow"
+    formats = ("JPEG", "PNG")
+
+    def version(self):
+        import PIL
+        return PIL.__version__
+
+    def encode(self, img, save_format, quality):
+        output = io.BytesIO()
+        if save_format == "JPEG":
+            img.save(output, "JPEG", quality=quality)
+        else:
+            img.save(output, "PNG")
+        return output.getvalue()
+
+
+class OpenCVBackend(EncoderBackend):
+    """OpenCV imencode (可选依赖 opencv-python)"""
+    name = "opencv"
+    formats = ("JPEG", "PNG")
+    png_compression = 6 # 与 Pillow 默认压缩级别一致，只比较速度而不牺牲体积
+
+    def available(self):
+        return importlib.util.find_spec("cv2") is not None
+
+    def version(self):
+        import cv2
+        return cv2.__version__
+
+    def encode(self, img, save_format, quality):
+        import cv2
+        import numpy as np
+        if img.mode not in ('L', 'RGB', 'RGBA'):
+            has_alpha = img.mode in ('LA', 'PA') or 'transparency' in img.info
+            img = img.convert('RGBA' if has_alpha else 'RGB')
+        array = np.asarray(img)
+        if img.mode == 'RGB':
+            array = cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+        elif img.mode == 'RGBA':
+            array = cv2.cvtColor(array, cv2.COLOR_RGBA2BGRA)
+        if save_format == "JPEG":
+            ok, buffer = cv2.imencode(".jpg", array, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        else:
+            ok, buffer = cv2.imencode(".png", array, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression])
+        if not ok:
+            raise RuntimeError("cv2.imencode 编码失败")
+        return buffer.tobytes()
+
+
+class CjpegBackend(EncoderBackend):
+    """外部 cjpeg (libjpeg-turbo / mozjpeg)，通过管道传入 PPM"""
+    name = "cjpeg"
+    formats = ("JPEG",)
+
+    def available(self):
+        return shutil.which("cjpeg") is not None
+
+    def version(self):
+        return shutil.which("cjpeg")
+
+    def encode(self, img, save_format, quality):
+        if img.mode not in ('L', 'RGB'):
+            img = img.convert('RGB')
+        ppm = io.BytesIO()
+        img.save(ppm, "PPM")
+        result = subprocess.run([shutil.which("cjpeg"), "-quality", str(quality)], input=ppm.getvalue(),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return result.stdout
+
+
+class OxipngBackend(EncoderBackend):
+    """外部 oxipng：Pillow 快速压缩后由 oxipng 无损优化"""
+    name = "oxipng"
+    formats = ("PNG",)
+
+    def available(self):
+        return shutil.which("oxipng") is not None
+
+    def version(self):
+        return shutil.which("oxipng")
+
+    def encode(self, img, save_format, quality):
+        png = io.BytesIO()
+        img.save(png, "PNG", compress_level=1)
+        result = subprocess.run([shutil.which("oxipng"), "-o", "2", "--strip", "safe", "--stdout", "-"],
+                                input=png.getvalue(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return result.stdout
+
+
+BACKENDS = {backend.name: backend for backend in
+            (PillowBackend(), OpenCVBackend(), CjpegBackend(), OxipngBackend())}
+
+_selection = None
+_selection_lock = threading.Lock()
+
+
+def available_backends(save_format=None):
+    """本机可用的后端名称列表，Pillow 总是排在第一位"""
+    return [name for name, backend in BACKENDS.items()
+            if (save_format is None or save_format in backend.formats) and backend.available()]
+
+
+def get_backend(name, save_format):
+    """返回名为 name 且支持 save_format 的可用后端，否则返回 Pillow 后端"""
+    backend = BACKENDS.get(name)
+    if backend is None or save_format not in backend.formats or not backend.available():
+        return BACKENDS[DEFAULT_BACKEND]
+    return backend
+
+
+def validate_output(data, save_format, size):
+    """检查编码结果是标准的 save_format 文件且尺寸为 size，不符合时抛出 ValueError"""
+    if not data.startswith(_SIGNATURES[save_format]):
+        raise ValueError(f"输出不是 {save_format} 文件")
+    with Image.open(io.BytesIO(data)) as img:
+        if img.format != save_format or img.size != size:
+            raise ValueError(f"输出格式或尺寸不符: {img.format} {img.size}")
+        img.load()
+
+
+def _benchmark_image(save_format, size=BENCHMARK_SIZE):
+    """生成确定性的测试图片：渐变 + 噪声，PNG 带透明通道"""
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 40)
+    channels = [gradient, noise, gradient.transpose(Image.FLIP_TOP_BOTTOM)]
+    if save_format == "PNG":
+        channels.append(gradient.transpose(Image.FLIP_LEFT_RIGHT))
+        return Image.merge('RGBA', channels)
+    return Image.merge('RGB', channels)
+
+
+def benchmark(save_format, backend_names=None, repeat=BENCHMARK_REPEAT, quality=BENCHMARK_QUALITY):
+    """对 save_format 的各个后端计时，返回 {后端: {'seconds', 'bytes'} 或 {'error'}}"""
+    img = _benchmark_image(save_format)
+    results = {}
+    for name in backend_names or available_backends(save_format):
+        backend = BACKENDS[name]
+        try:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = backend.encode(img, save_format, quality)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            validate_output(data, save_format, img.size)
+        except Exception as e:
+            results[name] = {'error': str(e)}
+        else:
+            results[name] = {'seconds': best, 'bytes': len(data)}
+    return results
+
+
+def _fingerprint():
+    """本机环境指纹：主机、Python 版本和各可用后端的版本"""
+    backends = {name: BACKENDS[name].version() for name in available_backends()}
+    return {'host': platform.node(), 'machine': platform.machine(),
+            'python': platform.python_version(), 'backends': backends}
+
+
+def cache_path():
+    cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.join(Path.home(), ".cache")
+    return Path(cache_root) / "bootanimation-tool" / CACHE_FILE_NAME
+
+
+def _load_cached_selection(fingerprint):
+    try:
+        with open(cache_path(), "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('fingerprint') != fingerprint:
+        return None
+    return cached
+
+
+def _save_cached_selection(cached):
+    path = cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cached, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"警告: 无法保存编码后端选择结果 {path}: {e}")
+
+
+def select_backends(refresh=False):
+    """为每种格式选择最快的后端，返回 {'selection': {格式: 后端}, 'results': 基准结果}
+
+    只有一个可用后端的格式不做测试。结果缓存在进程内和用户缓存目录中。
+    """
+    global _selection
+    with _selection_lock:
+        if _selection is not None and not refresh:
+            return _selection
+        fingerprint = _fingerprint()
+        cached = None if refresh else _load_cached_selection(fingerprint)
+        if cached is None:
+            selection = {}
+            results = {}
+            for save_format in _SIGNATURES:
+                candidates = available_backends(save_format)
+                if len(candidates) == 1:
+                    selection[save_format] = candidates[0]
+                    continue
+                results[save_format] = benchmark(save_format, candidates)
+                timed = {name: result['seconds'] for name, result in results[save_format].items()
+                         if 'seconds' in result}
+                best = min(timed, key=timed.get) if timed else DEFAULT_BACKEND
+                if DEFAULT_BACKEND in timed and timed[best] > timed[DEFAULT_BACKEND] * SELECTION_MARGIN:
+                    best = DEFAULT_BACKEND
+                selection[save_format] = best
+            cached = {'fingerprint': fingerprint, 'selection': selection, 'results': results}
+            if results:
+                _save_cached_selection(cached)
+        _selection = cached
+        return _selection
+
+
+def resolve_backends(preference=AUTO_BACKEND):
+    """把构建设置中的后端偏好解析为 {格式: 后端名称}
+
+    preference 为 "auto" 时使用基准测试选出的后端；为后端名称时，该后端不支持的
+    格式或本机不可用时改用 Pillow。
+    """
+    if preference == AUTO_BACKEND:
+        return dict(select_backends()['selection'])
+    return {save_format: get_backend(preference, save_format).name for save_format in _SIGNATURES}
+
+
+def format_backends(backends):
+    """构建报告中的后端说明，例如 "JPEG=opencv, PNG=pillow" """
+    return ", ".join(f"{save_format}={name}" for save_format, name in sorted(backends.items()))
+
+
+def format_benchmark(selected):
+    lines = [f"可用后端: {', '.join(available_backends())}"]
+    for save_format, results in sorted(selected['results'].items()):
+        lines.append(f"{save_format}:")
+        for name, result in results.items():
+            if 'error' in result:
+                lines.append(f"  {name:<8} 不可用: {result['error']}")
+            else:
+                lines.append(f"  {name:<8} {result['seconds'] * 1000:8.1f} ms  {result['bytes'] / 1024:8.1f} KB")
+    lines.append(f"当前选择: {format_backends(selected['selection'])}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看和测试帧编码后端")
+    parser.add_argument('--rebench', action='store_true', help="忽略缓存，重新运行基准测试")
+    args = parser.parse_args()
+    print(format_benchmark(select_backends(refresh=args.rebench)))
+    print(f"缓存文件: {cache_path()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
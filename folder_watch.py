@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+源文件夹监视 - 监视各段落的源图片目录，变化经去抖后通知主窗口增量更新
+
+使用 QFileSystemWatcher (Linux 上基于 inotify)，同时监视目录 (新增、删除、
+改名) 和其中的图片文件 (原地覆盖写入)。
+"""
+
+import os
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+# 与导入对话框支持的格式保持一致
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+DEFAULT_DEBOUNCE_MS = 500
+
+
+def file_state(path):
+    """文件的 (修改时间, 大小)，用于判断图片是否变化"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def scan_image_dir(directory):
+    """扫描目录中的图片，返回按文件名排序的 {路径: (修改时间, 大小)}"""
+    result = {}
+    try:
+        entries = sorted(Path(directory).iterdir(), key=lambda p: p.name)
+    except OSError:
+        return result
+    for path in entries:
+        if path.suffix.lower() not in IMAGE_EXTENSIONS or not path.is_file():
+            continue
+        try:
+            result[str(path)] = file_state(path)
+        except OSError:
+            # 扫描过程中被删除
+            continue
+    return result
+
+
+class FolderWatcher(QObject):
+    """监视各段落的源目录，目录内容稳定 debounce_ms 毫秒后发出 segment_changed(段落)"""
+    segment_changed = pyqtSignal(int)
+
+    def __init__(self, debounce_ms=DEFAULT_DEBOUNCE_MS, parent=None):
+        super().__init__(parent)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_path_changed)
+        self._watcher.fileChanged.connect(self._on_path_changed)
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(debounce_ms)
+        self._debounce_timer.timeout.connect(self._flush)
+        self._path_segments = {} # 路径 -> 段落
+        self._segment_dirs = {} # 段落 -> 源目录
+        self._pending_segments = set()
+
+    def segment_dir(self, segment_idx):
+        """段落对应的源目录，未监视时返回 None"""
+        return self._segment_dirs.get(segment_idx)
+
+    def set_segments(self, segment_dirs, segment_files=None):
+        """设置要监视的段落目录 {段落: 目录} 及其中的图片 {段落: [路径]}"""
+        segment_files = segment_files or {}
+        path_segments = {}
+        for seg_idx, directory in segment_dirs.items():
+            path_segments[os.path.abspath(directory)] = seg_idx
+            for path in segment_files.get(seg_idx, []):
+                path_segments[os.path.abspath(path)] = seg_idx
+
+        stale_paths = [path for path in self._watcher.files() + self._watcher.directories()
+                       if path not in path_segments]
+        if stale_paths:
+            self._watcher.removePaths(stale_paths)
+        watched = set(self._watcher.files() + self._watcher.directories())
+        new_paths = [path for path in path_segments if path not in watched and os.path.exists(path)]
+        if new_paths:
+            self._watcher.addPaths(new_paths)
+
+        self._path_segments = path_segments
+        self._segment_dirs = {seg_idx: os.path.abspath(directory) for seg_idx, directory in segment_dirs.items()}
+
+    def stop(self):
+        """停止监视"""
+        self._debounce_timer.stop()
+        self._pending_segments.clear()
+        paths = self._watcher.files() + self._watcher.directories()
+        if paths:
+            self._watcher.removePaths(paths)
+        self._path_segments = {}
+        self._segment_dirs = {}
+
+    def _on_path_changed(self, path):
+        seg_idx = self._path_segments.get(os.path.abspath(path))
+        if seg_idx is None:
+            return
+        self._pending_segments.add(seg_idx)
+        # 每次变化都重新计时，导出过程中的连续写入只触发一次更新
+        self._debounce_timer.start()
+
+    def _flush(self):
+        pending = sorted(self._pending_segments)
+        self._pending_segments.clear()
+        for seg_idx in pending:
+            self.segment_changed.emit(seg_idx)
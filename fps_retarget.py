@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧率重定向 - 通过重映射帧下标在改变帧率时保持每段的播放时长
+
+例如 60 FPS 的母版导出为 30 FPS 时每隔一帧取一帧，导出为 24 FPS 时
+按 2.5 的步长取帧；升帧率时则重复源帧。重复的帧只编码一次。
+"""
+
+import os
+
+
+def remap_indices(frame_count, source_fps, target_fps):
+    """返回输出帧对应的源帧下标列表
+
+    输出帧数为 round(frame_count * target_fps / source_fps)，至少 1 帧；
+    第 j 个输出帧取播放时刻 j / target_fps 时正在显示的源帧。
+    """
+    if frame_count <= 0:
+        return []
+    if source_fps <= 0 or target_fps <= 0:
+        raise ValueError("帧率必须为正数")
+    if source_fps == target_fps:
+        return list(range(frame_count))
+    output_count = max(1, round(frame_count * target_fps / source_fps))
+    return [min(frame_count - 1, j * source_fps // target_fps) for j in range(output_count)]
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def retarget_summary(segment_paths, source_fps, target_fps):
+    """估算帧率重定向对输出大小和解码速率的影响
+
+    segment_paths: {段落: [源图片路径, ...]}，字节数按源文件大小估算。
+    ZIP 中每个输出帧都是独立条目，因此重复帧仍计入输出大小，
+    但只需编码一次 (unique_frames)。
+    """
+    summary = {
+        'segments': {},
+        'source_frames': 0,
+        'output_frames': 0,
+        'unique_frames': 0,
+        'source_bytes': 0,
+        'output_bytes': 0,
+        'duration': 0.0,
+    }
+    for seg_idx, paths in sorted(segment_paths.items()):
+        sizes = [_file_size(p) for p in paths]
+        frame_map = remap_indices(len(paths), source_fps, target_fps)
+        seg_summary = {
+            'source_frames': len(paths),
+            'output_frames': len(frame_map),
+            'unique_frames': len(set(frame_map)),
+            'source_bytes': sum(sizes),
+            'output_bytes': sum(sizes[src_idx] for src_idx in frame_map),
+            'duration': len(frame_map) / target_fps,
+        }
+        summary['segments'][seg_idx] = seg_summary
+        for key in ('source_frames', 'output_frames', 'unique_frames',
+                    'source_bytes', 'output_bytes', 'duration'):
+            summary[key] += seg_summary[key]
+
+    summary['source_decode_fps'] = source_fps
+    summary['target_decode_fps'] = target_fps
+    # 设备每秒需要读取并解码的数据量
+    if summary['source_frames']:
+        summary['source_decode_rate'] = summary['source_bytes'] / summary['source_frames'] * source_fps
+    else:
+        summary['source_decode_rate'] = 0
+    if summary['output_frames']:
+        summary['target_decode_rate'] = summary['output_bytes'] / summary['output_frames'] * target_fps
+    else:
+        summary['target_decode_rate'] = 0
+    return summary
+
+
+def format_summary(summary):
+    """生成面向用户的单行摘要"""
+    mb = 1024 * 1024
+    return (f"{summary['source_frames']} 帧 @{summary['source_decode_fps']}FPS → "
+            f"{summary['output_frames']} 帧 @{summary['target_decode_fps']}FPS "
+            f"(需编码 {summary['unique_frames']} 帧)，时长 {summary['duration']:.2f} 秒\n"
+            f"预计大小 {summary['output_bytes'] / mb:.2f} MB (原 {summary['source_bytes'] / mb:.2f} MB)，"
+            f"解码负载 {summary['target_decode_rate'] / mb:.2f} MB/s "
+            f"(原 {summary['source_decode_rate'] / mb:.2f} MB/s)")
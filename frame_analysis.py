@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复帧分析 - 找出各段落中视觉上无法区分的连续帧
+
+在缩小后的灰度数组上批量计算相邻帧的差异指标 (MAE / 分块 SSIM)，
+差异低于阈值的帧可以在构建前被标记或剔除。
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from build_defaults import METRICS
+
+# 缩略图尺寸，必须能被 SSIM_BLOCK 整除
+THUMBNAIL_SIZE = (64, 64)
+SSIM_BLOCK = 8
+# 与锚点比较时每批处理的帧数，避免缓慢渐变时退化为平方复杂度
+ANCHOR_WINDOW = 32
+
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+
+def load_thumbnail(path, size=THUMBNAIL_SIZE):
+    """读取图片并缩小为灰度 float32 数组，透明区域按 alpha 预乘"""
+    with Image.open(path) as img:
+        # JPEG 可以在解码阶段直接按比例缩小，显著降低解码开销
+        img.draft('RGB', size)
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        if has_alpha:
+            img = img.convert('RGBA').resize(size, Image.BILINEAR, reducing_gap=3.0)
+            gray = np.asarray(img.convert('L'), dtype=np.float32)
+            alpha = np.asarray(img.getchannel('A'), dtype=np.float32) / 255.0
+            return gray * alpha
+        img = img.convert('L').resize(size, Image.BILINEAR, reducing_gap=3.0)
+        return np.asarray(img, dtype=np.float32)
+
+
+def load_thumbnails(paths, size=THUMBNAIL_SIZE, max_workers=None, progress_callback=None):
+    """并行读取缩略图，返回形状为 (N, H, W) 的数组
+
+    Pillow 解码时会释放 GIL，因此线程池即可利用多核。
+    """
+    stack = np.empty((len(paths), size[1], size[0]), dtype=np.float32)
+    if not paths:
+        return stack
+    workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, thumb in enumerate(executor.map(lambda p: load_thumbnail(p, size), paths)):
+            stack[i] = thumb
+            if progress_callback:
+                progress_callback(i + 1, len(paths))
+    return stack
+
+
+def _blocks(frames):
+    n, h, w = frames.shape
+    return frames.reshape(n, h // SSIM_BLOCK, SSIM_BLOCK, w // SSIM_BLOCK, SSIM_BLOCK)
+
+
+def block_mae(a, b):
+    """批量计算分块平均绝对误差的最大值，a/b 形状为 (N, H, W)，可广播
+
+    取最差的块而不是整帧平均，使局部的小幅运动不会被平均掉。
+    """
+    a, b = np.broadcast_arrays(a, b)
+    return np.abs(_blocks(a) - _blocks(b)).mean(axis=(2, 4)).max(axis=(1, 2))
+
+
+def block_ssim(a, b):
+    """批量计算分块 SSIM 的最小值，a/b 形状为 (N, H, W)，可广播"""
+    a, b = np.broadcast_arrays(a, b)
+    blocks_a = _blocks(a)
+    blocks_b = _blocks(b)
+    mu_a = blocks_a.mean(axis=(2, 4), keepdims=True)
+    mu_b = blocks_b.mean(axis=(2, 4), keepdims=True)
+    dev_a = blocks_a - mu_a
+    dev_b = blocks_b - mu_b
+    var_a = (dev_a * dev_a).mean(axis=(2, 4))
+    var_b = (dev_b * dev_b).mean(axis=(2, 4))
+    cov = (dev_a * dev_b).mean(axis=(2, 4))
+    mu_a = mu_a[:, :, 0, :, 0]
+    mu_b = mu_b[:, :, 0, :, 0]
+    ssim_map = ((2 * mu_a * mu_b + _SSIM_C1) * (2 * cov + _SSIM_C2)) / \
+               ((mu_a ** 2 + mu_b ** 2 + _SSIM_C1) * (var_a + var_b + _SSIM_C2))
+    return ssim_map.min(axis=(1, 2))
+
+
+def _similar(a, b, metric, threshold):
+    """返回 (是否近似的布尔数组, 指标值数组)"""
+    if metric == 'ssim':
+        scores = block_ssim(a, b)
+        return scores >= threshold, scores
+    scores = block_mae(a, b)
+    return scores <= threshold, scores
+
+
+def select_near_duplicates(stack, metric='mae', threshold=None):
+    """在一个段落的帧序列中选出可剔除的近似帧
+
+    先向量化计算相邻帧差异得到候选帧，再将每段连续候选与其前一个
+    保留帧 (锚点) 比较，避免缓慢渐变被逐帧累积误删。锚点比较的批大小
+    从 1 开始按需倍增，上限为 ANCHOR_WINDOW。
+    返回 (可剔除的段内下标列表, 相邻帧指标数组)。
+    """
+    if metric not in METRICS:
+        raise ValueError(f"未知的差异指标: {metric}")
+    if threshold is None:
+        threshold = METRICS[metric][0]
+    if len(stack) < 2:
+        return [], np.empty(0, dtype=np.float32)
+
+    candidate, scores = _similar(stack[:-1], stack[1:], metric, threshold)
+
+    dropped = []
+    i = 0
+    count = len(candidate)
+    while i < count:
+        if not candidate[i]:
+            i += 1
+            continue
+        run_end = i
+        while run_end < count and candidate[run_end]:
+            run_end += 1
+        # 候选帧为 stack[i+1 .. run_end]，锚点为 stack[i]
+        anchor = i
+        pos = i + 1
+        window = 1
+        while pos <= run_end:
+            window_end = min(run_end + 1, pos + window)
+            similar, _ = _similar(stack[anchor][None], stack[pos:window_end], metric, threshold)
+            if similar.all():
+                dropped.extend(range(pos, window_end))
+                pos = window_end
+                window = min(window * 2, ANCHOR_WINDOW)
+                continue
+            first_diff = int(np.argmin(similar))
+            dropped.extend(range(pos, pos + first_diff))
+            anchor = pos + first_diff
+            pos = anchor + 1
+            window = 1
+        i = run_end
+    return dropped, scores
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def find_near_duplicates(images_data, metric='mae', threshold=None, progress_callback=None):
+    """分析所有段落的近似重复帧
+
+    images_data 为主窗口中的图片数据列表 (不会被修改)。返回字典:
+    {
+        'drop_indices': 可剔除帧在 images_data 中的下标集合,
+        'segments': {段落: {'total': 帧数, 'dropped': 剔除数}},
+        'total_frames', 'frames_saved', 'total_bytes', 'bytes_saved', 'elapsed'
+    }
+    字节数按源文件大小估算。
+    """
+    start = time.perf_counter()
+    segments = {}
+    for global_idx, img_d in enumerate(images_data):
+        segments.setdefault(img_d.get('segment') or 0, []).append(global_idx)
+
+    all_indices = [idx for seg_idx in sorted(segments) for idx in segments[seg_idx]]
+    stack = load_thumbnails([images_data[idx]['path'] for idx in all_indices],
+                            progress_callback=progress_callback)
+
+    result = {
+        'drop_indices': set(),
+        'segments': {},
+        'total_frames': len(images_data),
+        'frames_saved': 0,
+        'total_bytes': sum(_file_size(img_d['path']) for img_d in images_data),
+        'bytes_saved': 0,
+        'elapsed': 0.0,
+    }
+    offset = 0
+    for seg_idx in sorted(segments):
+        seg_indices = segments[seg_idx]
+        seg_stack = stack[offset:offset + len(seg_indices)]
+        offset += len(seg_indices)
+        dropped, _ = select_near_duplicates(seg_stack, metric, threshold)
+        for local_idx in dropped:
+            result['drop_indices'].add(seg_indices[local_idx])
+        result['segments'][seg_idx] = {'total': len(seg_indices), 'dropped': len(dropped)}
+
+    result['frames_saved'] = len(result['drop_indices'])
+    result['bytes_saved'] = sum(_file_size(images_data[idx]['path']) for idx in result['drop_indices'])
+    result['elapsed'] = time.perf_counter() - start
+    return result
+
+
+def format_report(result, fps):
+    """生成面向用户的分析报告文本"""
+    lines = []
+    total = result['total_frames']
+    saved = result['frames_saved']
+    percent = saved / total * 100 if total else 0
+    lines.append(f"共 {total} 帧，可剔除近似帧 {saved} 帧 ({percent:.1f}%)")
+    lines.append(f"预计节省: {result['bytes_saved'] / 1024 / 1024:.2f} MB "
+                 f"/ {result['total_bytes'] / 1024 / 1024:.2f} MB")
+    if fps > 0 and saved:
+        lines.append(f"剔除后每次播放缩短约 {saved / fps:.2f} 秒 (@{fps} FPS)")
+    for seg_idx, seg_info in sorted(result['segments'].items()):
+        lines.append(f"  Part {seg_idx}: {seg_info['dropped']} / {seg_info['total']} 帧")
+    lines.append(f"分析耗时: {result['elapsed']:.2f} 秒")
+    return "\n".join(lines)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧编码 - 将源图片编码为 bootanimation 使用的 PNG/JPEG 帧
+
+实际的编码由 encoder_backends 中的后端完成，默认使用 Pillow。
+"""
+
+import io
+import os
+import uuid
+
+from PIL import Image
+
+import encoder_backends
+from build_defaults import DEFAULT_JPEG_QUALITY
+
+
+def output_format(original_format):
+    """根据源图片格式返回 (保存格式, 扩展名)，PNG/JPEG 保持原格式，其余转为 PNG"""
+    original_format = (original_format or '').upper()
+    if original_format in ("JPEG", "JPG"):
+        return "JPEG", "jpg"
+    return "PNG", "png"
+
+
+def _tmp_path_for(dest_path):
+    return f"{dest_path}.{uuid.uuid4().hex}.tmp"
+
+
+def _prepare_image(img, save_format):
+    """按保存格式准备图片，JPEG 的透明区域以白色背景合成"""
+    if save_format == "JPEG":
+        if img.mode == 'RGBA' or img.mode == 'LA' or (img.mode == 'P' and 'transparency' in img.info):
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            img_rgb = Image.new("RGB", img.size, (255, 255, 255))
+            img_rgb.paste(img, mask=img.split()[-1])
+            img = img_rgb
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+    return img
+
+
+def encode_image(img, save_format, quality, backend=None):
+    """用指定后端编码图片，返回 (字节, 实际使用的后端名称)，后端为 None 时使用 Pillow
+
+    指定的后端在本机不可用或编码出错时改用 Pillow，保证输出仍是标准 PNG/JPEG；
+    调用方应按返回的实际后端记录缓存和报告。
+    """
+    img = _prepare_image(img, save_format)
+    encoder = encoder_backends.get_backend(backend or encoder_backends.DEFAULT_BACKEND, save_format)
+    if encoder.name != encoder_backends.DEFAULT_BACKEND:
+        try:
+            return encoder.encode(img, save_format, quality), encoder.name
+        except Exception as e:
+            print(f"警告: 编码后端 {encoder.name} 出错 ({e})，改用 Pillow")
+            encoder = encoder_backends.get_backend(encoder_backends.DEFAULT_BACKEND, save_format)
+    return encoder.encode(img, save_format, quality), encoder.name
+
+
+def encode_frame(source_path, save_format, quality, dest_path, backend=None):
+    """编码一帧并写入 dest_path
+
+    先写入同目录的 .tmp 文件再改名，中断时不会留下看似完整的半截文件。
+    临时文件名唯一，多个构建同时写入共享缓存中的同一帧时互不干扰。
+    返回 (dest_path, 实际使用的后端名称)。
+    """
+    with Image.open(source_path) as img:
+        data, used_backend = encode_image(img, save_format, quality, backend)
+    return write_frame_bytes(data, dest_path), used_backend
+
+
+def encode_image_bytes(data, save_format, quality, backend=None):
+    """编码内存中的源图片字节，返回 (编码后的字节, 实际使用的后端名称) (供远程编码节点使用)"""
+    with Image.open(io.BytesIO(data)) as img:
+        return encode_image(img, save_format, quality, backend)
+
+
+def write_frame_bytes(data, dest_path):
+    """把已编码的字节写入 dest_path，同样先写临时文件再改名"""
+    tmp_path = _tmp_path_for(dest_path)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, dest_path)
+    return dest_path
@@ -7,177 +7,93 @@ Android Boot Animation Creator
 
 import sys
 import os
-import zipfile
-import shutil
+import time
 from pathlib import Path
-from PIL import Image
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QListWidget, QSpinBox, QTextEdit,
     QFileDialog, QMessageBox, QProgressBar, QGroupBox,
     QGridLayout, QLineEdit, QComboBox, QCheckBox, QTabWidget, QListWidgetItem,
-    QSplitter
+    QSplitter, QDoubleSpinBox, QTableWidget, QTableWidgetItem, QHeaderView,
+    QAbstractItemView
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt5.QtGui import QPixmap, QFont, QIcon
 
+import fps_retarget
+from build_defaults import DEFAULT_JPEG_QUALITY, METRICS
+from folder_watch import FolderWatcher, file_state, scan_image_dir
+
+# Pillow、numpy 以及构建/分析/远程编码模块在首次使用时才在各方法中导入，
+# 启动时只加载 PyQt5 和不依赖它们的模块，缩短冷启动时间
+
 
 class AnimationCreator(QThread):
-    """动画创建线程"""
+    """动画创建线程，根据项目快照构建，编码任务提交到共享线程池"""
     progress = pyqtSignal(int)
+    throughput = pyqtSignal(float)
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
-    first_image_width = 0
-    first_image_height = 0
+    cancelled = pyqtSignal(str)
     
-    def __init__(self, images_data, output_path, fps, segment_params_list):
+    def __init__(self, spec, executor=None):
         super().__init__()
-        self.images_data = images_data
-        self.output_path = output_path
-        self.fps = fps
-        self.segment_params_list = segment_params_list # 列表，每个元素是{'loop': count, 'pause': time}
+        self.spec = spec # animation_builder.BuildSpec，不可变快照
+        self.executor = executor
+
+    def cancel(self):
+        """请求取消构建，已完成的帧保留在检查点中"""
+        self.requestInterruption()
+
+    def _on_progress(self, percent, frames_per_second):
+        self.progress.emit(percent)
+        if frames_per_second:
+            self.throughput.emit(frames_per_second)
     
     def run(self):
-        temp_dir = Path(self.output_path).parent / "temp_bootanimation"
+        import animation_builder
         try:
-            if temp_dir.exists():
-                shutil.rmtree(temp_dir)
-            temp_dir.mkdir()
-
-            if not self.images_data:
-                self.error.emit("没有图片可处理。")
-                return
-
-            first_valid_image_path = None
-            for img_d in self.images_data:
-                if Path(img_d['path']).exists():
-                    first_valid_image_path = img_d['path']
-                    break
-            if not first_valid_image_path:
-                self.error.emit("没有有效的图片文件路径。")
-                return
-                
-            with Image.open(first_valid_image_path) as img_for_size:
-                self.first_image_width, self.first_image_height = img_for_size.size
-
-            segment_processing_info = {}
-            active_segments = sorted(list(set(img.get('segment', 0) for img in self.images_data)))
-            
-            for img_d in self.images_data:
-                if 'segment' not in img_d or img_d['segment'] is None:
-                    img_d['segment'] = 0 
-            active_segments = sorted(list(set(img['segment'] for img in self.images_data)))
-            
-            if not active_segments and self.images_data: 
-                self.error.emit("图片数据存在但无法确定活动段落。")
-                return
+            result = animation_builder.build_animation(
+                self.spec, self.executor,
+                progress_callback=self._on_progress,
+                is_cancelled=self.isInterruptionRequested
+            )
+            self.finished.emit(result['message'])
+        except animation_builder.BuildCancelled as e:
+            self.cancelled.emit(str(e))
+        except animation_builder.BuildError as e:
+            self.error.emit(str(e))
+        except Exception as e:
+            import traceback
+            print(f"创建动画线程 'run' 方法内部发生严重错误: {str(e)}")
+            print(traceback.format_exc())
+            self.error.emit(f"创建动画时发生严重错误: {str(e)}，已完成的帧已保存，再次创建时将从断点继续")
 
-            for seg_idx in active_segments:
-                seg_path = temp_dir / f"processed_part{seg_idx}"
-                seg_path.mkdir(exist_ok=True)
-                segment_processing_info[seg_idx] = {
-                    'path': seg_path,
-                    'image_count': 0
-                }
-
-            total_images_to_process = len(self.images_data)
-            for i, image_info in enumerate(self.images_data):
-                segment_idx = image_info['segment']
-                
-                if segment_idx not in segment_processing_info:
-                    print(f"警告: 图片 {image_info.get('filename', '未知文件名')} 的段落索引 {segment_idx} 未在预处理信息中找到，跳过。")
-                    continue 
 
-                current_segment_info = segment_processing_info[segment_idx]
-                image_path_str = image_info['path']
-                original_format = image_info.get('format','').upper()
-                
-                try:
-                    with Image.open(image_path_str) as img:
-                        if original_format in ["PNG", "JPEG", "JPG"]:
-                            output_extension = original_format.lower()
-                            if output_extension == "jpeg": output_extension = "jpg"
-                            save_format = original_format
-                            if save_format == "JPG": save_format = "JPEG"
-                        else:
-                            output_extension = "png"
-                            save_format = "PNG"
-
-                        output_name = f"{current_segment_info['image_count']:05d}.{output_extension}"
-                        save_path = current_segment_info['path'] / output_name
-                        current_segment_info['image_count'] += 1
-
-                        if save_format == "PNG":
-                            img.save(save_path, save_format)
-                        elif save_format == "JPEG":
-                            if img.mode == 'RGBA' or img.mode == 'LA' or (img.mode == 'P' and 'transparency' in img.info):
-                                img_rgb = Image.new("RGB", img.size, (255, 255, 255))
-                                img_rgb.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' or img.mode == 'LA' else None)
-                                img = img_rgb
-                            elif img.mode != 'RGB':
-                                img = img.convert('RGB')
-                            img.save(save_path, "JPEG", quality=95)
-                        else:
-                            img.save(save_path, "PNG")
-                except FileNotFoundError:
-                    print(f"错误: 无法找到图片文件 {image_path_str}，跳过。")
-                    total_images_to_process -=1 
-                    continue 
-                except Exception as img_e:
-                    print(f"错误: 处理图片 {image_path_str} 时发生错误: {img_e}，跳过。")
-                    total_images_to_process -=1 
-                    continue 
-                
-                if total_images_to_process > 0: 
-                    progress_value = int((i + 1) / total_images_to_process * 80)
-                    self.progress.emit(progress_value)
-            
-            desc_content_lines = []
-            desc_content_lines.append(f"{self.first_image_width} {self.first_image_height} {self.fps}")
-            
-            valid_segments_for_desc = 0
-            for seg_idx in active_segments:
-                if seg_idx in segment_processing_info and segment_processing_info[seg_idx]['image_count'] > 0:
-                    params = self.segment_params_list[seg_idx] if seg_idx < len(self.segment_params_list) else {'loop': 0, 'pause': 0}
-                    loop_count = params.get('loop', 0)
-                    pause_time = params.get('pause', 0)
-                    desc_content_lines.append(f"p {loop_count} {pause_time} part{seg_idx}")
-                    valid_segments_for_desc +=1
-            
-            if valid_segments_for_desc == 0:
-                self.error.emit("没有成功处理任何图片段落以生成动画。")
-                return
+class FrameAnalyzer(QThread):
+    """近似帧分析线程"""
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(dict)
+    error = pyqtSignal(str)
 
-            with open(temp_dir / "desc.txt", "w") as f:
-                f.write("\n".join(desc_content_lines) + "\n")
-            
-            self.progress.emit(90)
-            
-            with zipfile.ZipFile(self.output_path, 'w', zipfile.ZIP_STORED) as zipf:
-                zipf.write(temp_dir / "desc.txt", "desc.txt")
-                
-                for seg_idx in active_segments:
-                    if seg_idx in segment_processing_info and segment_processing_info[seg_idx]['image_count'] > 0:
-                        source_image_dir = segment_processing_info[seg_idx]['path']
-                        zip_target_dir = f"part{seg_idx}"
-                        for img_file in source_image_dir.iterdir():
-                            if img_file.is_file():
-                                zipf.write(img_file, f"{zip_target_dir}/{img_file.name}")
-            
-            self.progress.emit(100)
-            self.finished.emit("动画创建成功！")
+    def __init__(self, images_data, metric, threshold):
+        super().__init__()
+        self.images_data = list(images_data)
+        self.metric = metric
+        self.threshold = threshold
 
+    def run(self):
+        import frame_analysis
+        try:
+            result = frame_analysis.find_near_duplicates(
+                self.images_data, self.metric, self.threshold,
+                progress_callback=lambda done, total: self.progress.emit(int(done / total * 100))
+            )
+            self.finished.emit(result)
         except Exception as e:
             import traceback
-            print(f"创建动画线程 'run' 方法内部发生严重错误: {str(e)}")
             print(traceback.format_exc())
-            self.error.emit(f"创建动画时发生严重错误: {str(e)}")
-        finally:
-            if temp_dir.exists():
-                try:
-                    shutil.rmtree(temp_dir)
-                except Exception as e_clean:
-                    print(f"清理临时目录 {temp_dir} 时出错: {e_clean}")
+            self.error.emit(f"分析近似帧时发生错误: {str(e)}")
 
 
 class BootAnimationCreator(QMainWindow):
@@ -189,6 +105,18 @@ class BootAnimationCreator(QMainWindow):
         self.setGeometry(100, 100, 950, 700) # 增大默认窗口尺寸
         self.images_data = [] 
         self.segment_widgets_list = [] # 存储每个段落的UI控件
+        self.build_jobs = [] # 构建队列中的任务，每个元素是一个字典
+        self._next_job_id = 1
+        # 所有构建任务共享的编码线程池 (工作线程预算)，第一次在本机构建时创建
+        self.encode_worker_count = os.cpu_count() or 1
+        self.encode_executor = None
+        self.remote_pools = {} # 远程编码节点列表 -> RemoteEncoderPool，多个任务共享
+        # 监视模式：源目录变化后增量更新图片列表并在后台重建
+        self.folder_watcher = FolderWatcher(parent=self)
+        self.folder_watcher.segment_changed.connect(self.on_watched_segment_changed)
+        self._watch_rebuild_pending = False
+        self._watch_scans = {} # 段落 -> (目录, 上一次扫描结果 {路径: 文件状态})
+        self._analysis_snapshot = None # 近似帧分析开始时的图片列表标识
         self.init_ui()
         self._add_new_segment_ui() # 启动时至少创建一个段落 (part0)
     
@@ -362,6 +290,7 @@ class BootAnimationCreator(QMainWindow):
         self.fps_spinbox = QSpinBox()
         self.fps_spinbox.setRange(1, 60)
         self.fps_spinbox.setValue(30)
+        self.fps_spinbox.valueChanged.connect(self.update_retarget_info)
         settings_layout.addWidget(self.fps_spinbox, 0, 1)
         
         settings_layout.addWidget(QLabel("输出路径:"), 1, 0)
@@ -372,7 +301,62 @@ class BootAnimationCreator(QMainWindow):
         self.browse_btn = QPushButton("浏览")
         self.browse_btn.clicked.connect(self.browse_output_path)
         settings_layout.addWidget(self.browse_btn, 1, 3)
+
+        self.retarget_checkbox = QCheckBox("按时长重定向帧率")
+        self.retarget_checkbox.setToolTip("保持每段播放时长不变，按目标帧率丢弃或重复源帧")
+        self.retarget_checkbox.toggled.connect(self.update_retarget_info)
+        settings_layout.addWidget(self.retarget_checkbox, 2, 0, 1, 2)
+        settings_layout.addWidget(QLabel("源帧率:"), 2, 2)
+        self.source_fps_spinbox = QSpinBox()
+        self.source_fps_spinbox.setRange(1, 120)
+        self.source_fps_spinbox.setValue(60)
+        self.source_fps_spinbox.setEnabled(False)
+        self.source_fps_spinbox.valueChanged.connect(self.update_retarget_info)
+        settings_layout.addWidget(self.source_fps_spinbox, 2, 3)
+
+        self.retarget_info_label = QLabel()
+        self.retarget_info_label.setWordWrap(True)
+        self.retarget_info_label.setVisible(False)
+        settings_layout.addWidget(self.retarget_info_label, 3, 0, 1, 4)
+
+        settings_layout.addWidget(QLabel("JPEG 质量:"), 4, 0)
+        self.quality_spinbox = QSpinBox()
+        self.quality_spinbox.setRange(1, 100)
+        self.quality_spinbox.setValue(DEFAULT_JPEG_QUALITY)
+        settings_layout.addWidget(self.quality_spinbox, 4, 1)
+
+        self.watch_checkbox = QCheckBox("监视源文件夹并自动重建")
+        self.watch_checkbox.setToolTip("源图片目录中的文件新增、修改或删除后，自动更新图片列表并在后台重建，只重新编码变化的帧")
+        self.watch_checkbox.toggled.connect(self.toggle_watch_mode)
+        settings_layout.addWidget(self.watch_checkbox, 5, 0, 1, 4)
+
+        settings_layout.addWidget(QLabel("远程编码节点:"), 6, 0)
+        self.remote_workers_edit = QLineEdit()
+        self.remote_workers_edit.setPlaceholderText("host:port, host:port (留空则在本机编码)")
+        self.remote_workers_edit.setToolTip("在其他机器上运行 python encode_worker.py serve --host 0.0.0.0 启动编码节点")
+        settings_layout.addWidget(self.remote_workers_edit, 6, 1, 1, 3)
         right_panel_layout.addWidget(settings_group)
+
+        # 近似帧分析
+        analysis_group = QGroupBox("近似帧分析")
+        analysis_layout = QGridLayout(analysis_group)
+        analysis_layout.addWidget(QLabel("差异指标:"), 0, 0)
+        self.metric_combo = QComboBox()
+        for metric_name in METRICS:
+            self.metric_combo.addItem(metric_name.upper(), metric_name)
+        self.metric_combo.currentIndexChanged.connect(self._on_metric_changed)
+        analysis_layout.addWidget(self.metric_combo, 0, 1)
+
+        analysis_layout.addWidget(QLabel("阈值:"), 0, 2)
+        self.threshold_spinbox = QDoubleSpinBox()
+        self.threshold_spinbox.setDecimals(3)
+        analysis_layout.addWidget(self.threshold_spinbox, 0, 3)
+
+        self.analyze_btn = QPushButton("分析近似帧")
+        self.analyze_btn.clicked.connect(self.analyze_near_duplicates)
+        analysis_layout.addWidget(self.analyze_btn, 1, 0, 1, 4)
+        self._on_metric_changed()
+        right_panel_layout.addWidget(analysis_group)
         
         # 预览区域
         preview_group = QGroupBox("预览")
@@ -405,6 +389,36 @@ class BootAnimationCreator(QMainWindow):
         self.create_btn.clicked.connect(self.create_animation)
         self.create_btn.setMinimumHeight(40)
         main_layout.addWidget(self.create_btn)
+
+        # --- 构建队列 ---
+        queue_group = QGroupBox("构建队列")
+        queue_layout = QVBoxLayout(queue_group)
+        self.queue_table = QTableWidget(0, 6)
+        self.queue_table.setHorizontalHeaderLabels(["#", "输出文件", "参数", "状态", "进度", "速度"])
+        self.queue_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.queue_table.verticalHeader().setVisible(False)
+        self.queue_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.queue_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.queue_table.setMaximumHeight(160)
+        queue_layout.addWidget(self.queue_table)
+
+        queue_controls_layout = QHBoxLayout()
+        queue_controls_layout.addWidget(QLabel("并行任务数:"))
+        self.max_jobs_spinbox = QSpinBox()
+        self.max_jobs_spinbox.setRange(1, 8)
+        self.max_jobs_spinbox.setValue(3)
+        self.max_jobs_spinbox.valueChanged.connect(self._start_queued_jobs)
+        queue_controls_layout.addWidget(self.max_jobs_spinbox)
+        queue_controls_layout.addWidget(QLabel(f"共享编码线程: {self.encode_worker_count}"))
+        queue_controls_layout.addStretch()
+        self.cancel_job_btn = QPushButton("取消所选任务")
+        self.cancel_job_btn.clicked.connect(self.cancel_selected_jobs)
+        queue_controls_layout.addWidget(self.cancel_job_btn)
+        self.clear_jobs_btn = QPushButton("清除已结束")
+        self.clear_jobs_btn.clicked.connect(self.clear_finished_jobs)
+        queue_controls_layout.addWidget(self.clear_jobs_btn)
+        queue_layout.addLayout(queue_controls_layout)
+        main_layout.addWidget(queue_group)
         
         self.status_label = QLabel("就绪")
         main_layout.addWidget(self.status_label)
@@ -421,6 +435,7 @@ class BootAnimationCreator(QMainWindow):
         )
         
         if files:
+            from PIL import Image
             # Flag to process default output path only for the first file of the first import to Part 0
             processed_default_path_for_part0_batch = False 
             is_first_import_to_empty_part0 = segment_index == 0 and not any(img_d.get('segment') == 0 for img_d in self.images_data)
@@ -447,7 +462,8 @@ class BootAnimationCreator(QMainWindow):
                             'size': img.size,
                             'format': img.format,
                             'filename': os.path.basename(f_path),
-                            'segment': segment_index 
+                            'segment': segment_index,
+                            'file_state': file_state(f_path) # 监视模式下用于判断文件是否变化
                         })
                         
                         self.status_label.setText(f"已导入到 Part {segment_index}: {os.path.basename(f_path)}")
@@ -495,9 +511,34 @@ class BootAnimationCreator(QMainWindow):
                 target_list_widget = self.segment_widgets_list[segment_idx]['image_list']
                 
                 item_text = f"{target_list_widget.count() + 1:03d}. {img_data_item['filename']} ({img_data_item['size'][0]}x{img_data_item['size'][1]}, {img_data_item['format']})"
+                if img_data_item.get('near_duplicate'):
+                    item_text += " [近似帧]"
                 list_item = QListWidgetItem(item_text)
                 list_item.setData(Qt.UserRole, global_idx) # 存储的是在 self.images_data 中的全局索引
                 target_list_widget.addItem(list_item)
+
+        self.update_retarget_info()
+        if self.watch_checkbox.isChecked():
+            self._refresh_watch_paths()
+
+    def update_retarget_info(self):
+        """更新帧率重定向对输出帧数、大小和解码速率影响的预估"""
+        enabled = self.retarget_checkbox.isChecked()
+        self.source_fps_spinbox.setEnabled(enabled)
+        self.retarget_info_label.setVisible(enabled)
+        if not enabled:
+            return
+        if not self.images_data:
+            self.retarget_info_label.setText("导入图片后显示重定向预估")
+            return
+
+        segment_paths = {}
+        for img_d in self.images_data:
+            segment_paths.setdefault(img_d.get('segment') or 0, []).append(img_d['path'])
+        summary = fps_retarget.retarget_summary(
+            segment_paths, self.source_fps_spinbox.value(), self.fps_spinbox.value()
+        )
+        self.retarget_info_label.setText(fps_retarget.format_summary(summary))
     
     def _display_preview(self, image_data):
         """根据给定的image_data显示预览"""
@@ -548,6 +589,91 @@ class BootAnimationCreator(QMainWindow):
             print(f"Error in preview_image_from_item: Item has invalid data_idx '{data_idx}'. Resetting preview.")
             self._display_preview(None) # Reset preview
     
+    def _on_metric_changed(self):
+        """切换差异指标时更新阈值范围和默认值"""
+        metric = self.metric_combo.currentData()
+        if metric is None:
+            return
+        default_threshold, description = METRICS[metric]
+        if metric == 'ssim':
+            self.threshold_spinbox.setRange(0.0, 1.0)
+            self.threshold_spinbox.setSingleStep(0.001)
+        else:
+            self.threshold_spinbox.setRange(0.0, 255.0)
+            self.threshold_spinbox.setSingleStep(0.1)
+        self.threshold_spinbox.setValue(default_threshold)
+        self.threshold_spinbox.setToolTip(description)
+
+    def analyze_near_duplicates(self):
+        """分析所有段落中的近似重复帧"""
+        if not self.images_data:
+            QMessageBox.warning(self, "警告", "请先导入图片！")
+            return
+
+        self.analyze_btn.setEnabled(False)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.status_label.setText("正在分析近似帧...")
+
+        # 记录分析时的图片列表，结果只能应用到同一列表上
+        self._analysis_snapshot = self._image_list_identity()
+        self.analysis_thread = FrameAnalyzer(
+            self.images_data,
+            self.metric_combo.currentData(),
+            self.threshold_spinbox.value()
+        )
+        self.analysis_thread.progress.connect(self.progress_bar.setValue)
+        self.analysis_thread.finished.connect(self.on_analysis_finished)
+        self.analysis_thread.error.connect(self.on_analysis_error)
+        self.analysis_thread.start()
+
+    def _image_list_identity(self):
+        """标识当前图片列表内容的元组：每帧的路径、段落和文件状态"""
+        return tuple((img_d['path'], img_d.get('segment') or 0, img_d.get('file_state'))
+                     for img_d in self.images_data)
+
+    def on_analysis_finished(self, result):
+        """近似帧分析完成，标记近似帧并询问是否剔除"""
+        self.analyze_btn.setEnabled(True)
+        self.progress_bar.setVisible(False)
+
+        # 分析期间图片列表可能被修改 (包括重新导入相同数量的图片或监视模式原地更新)，此时结果已失效
+        if self._image_list_identity() != self._analysis_snapshot:
+            self.status_label.setText("图片列表已变化，请重新分析")
+            return
+
+        drop_indices = result['drop_indices']
+        for idx, img_d in enumerate(self.images_data):
+            img_d['near_duplicate'] = idx in drop_indices
+        self.update_image_list()
+
+        import frame_analysis
+        report = frame_analysis.format_report(result, self.fps_spinbox.value())
+        self.status_label.setText(f"近似帧分析完成: 可剔除 {result['frames_saved']} 帧")
+        if not drop_indices:
+            QMessageBox.information(self, "近似帧分析", report)
+            return
+
+        reply = QMessageBox.question(
+            self, "近似帧分析", report + "\n\n是否剔除这些近似帧？",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            # 对话框打开期间监视模式仍可能更新列表
+            if self._image_list_identity() != self._analysis_snapshot:
+                self.status_label.setText("图片列表已变化，请重新分析")
+                return
+            self.images_data = [img_d for idx, img_d in enumerate(self.images_data) if idx not in drop_indices]
+            self.update_image_list()
+            self.status_label.setText(f"已剔除 {len(drop_indices)} 个近似帧")
+
+    def on_analysis_error(self, error_message):
+        """近似帧分析出错"""
+        self.analyze_btn.setEnabled(True)
+        self.progress_bar.setVisible(False)
+        self.status_label.setText("分析失败")
+        QMessageBox.critical(self, "错误", error_message)
+
     def browse_output_path(self):
         """浏览输出路径"""
         file_path, _ = QFileDialog.getSaveFileName(
@@ -559,7 +685,7 @@ class BootAnimationCreator(QMainWindow):
             self.output_path_edit.setText(file_path)
     
     def create_animation(self):
-        """创建动画"""
+        """创建动画：对当前项目做快照并加入构建队列"""
         if not self.images_data:
             QMessageBox.warning(self, "警告", "请先导入图片！")
             return
@@ -568,11 +694,30 @@ class BootAnimationCreator(QMainWindow):
         if not output_path:
             QMessageBox.warning(self, "警告", "请选择输出路径！")
             return
-        
-        self.create_btn.setEnabled(False)
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(0)
-        
+
+        # 同一输出路径共用临时目录和检查点，不能同时构建
+        active_jobs = self._active_jobs_for(output_path)
+        if active_jobs:
+            QMessageBox.warning(self, "警告", f"任务 #{active_jobs[0]['id']} 正在输出到同一路径，请更换输出路径或等待其完成。")
+            return
+
+        from encode_worker import parse_addresses
+        try:
+            parse_addresses(self.remote_workers_edit.text())
+        except ValueError:
+            QMessageBox.warning(self, "警告", "远程编码节点格式错误，应为 host:port, host:port")
+            return
+
+        self._enqueue_build(self._snapshot_project(output_path))
+
+    def _active_jobs_for(self, output_path):
+        """返回输出到 output_path 且尚未结束的任务"""
+        return [job for job in self.build_jobs
+                if job['status'] in ("排队中", "进行中", "正在取消") and
+                os.path.abspath(job['spec'].output_path) == os.path.abspath(output_path)]
+
+    def _snapshot_project(self, output_path):
+        """对当前项目和参数做不可变快照"""
         # --- 收集所有段落的参数 (循环次数和暂停时间) ---
         segment_params_list = [] # 将存储每个段落的 {'loop': count, 'pause': time} 字典
         
@@ -586,46 +731,363 @@ class BootAnimationCreator(QMainWindow):
                 pause_time = seg_widget_info['pause_spinbox'].value()
                 segment_params_list.append({'loop': loop_count, 'pause': pause_time})
 
-        self.animation_thread = AnimationCreator(
-            self.images_data, 
+        source_fps = self.source_fps_spinbox.value() if self.retarget_checkbox.isChecked() else None
+
+        # 快照之后继续编辑项目不会影响已入队的任务；监视模式下保留编码缓存供增量重建
+        import animation_builder
+        import encoder_backends
+        return animation_builder.snapshot_project(
+            self.images_data,
             output_path,
             self.fps_spinbox.value(),
-            segment_params_list # 传递包含所有段落参数的列表
+            segment_params_list, # 传递包含所有段落参数的列表
+            source_fps,
+            self.quality_spinbox.value(),
+            keep_cache=self.watch_checkbox.isChecked(),
+            # 图形界面在本机交互构建，使用基准测试选出的最快后端；
+            # 构建服务默认固定为 Pillow，输出不随机器变化
+            encoder_backend=encoder_backends.AUTO_BACKEND
         )
-        
-        self.animation_thread.progress.connect(self.progress_bar.setValue)
-        self.animation_thread.finished.connect(self.on_animation_finished)
-        self.animation_thread.error.connect(self.on_animation_error)
-        
-        self.animation_thread.start()
-        self.status_label.setText("正在创建动画...")
+
+    def _encoder_for(self, remote_workers):
+        """返回任务使用的编码池：本机共享线程池或共享的远程编码池"""
+        if not remote_workers:
+            if self.encode_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self.encode_executor = ThreadPoolExecutor(max_workers=self.encode_worker_count)
+            return self.encode_executor
+        from encode_worker import RemoteEncoderPool, parse_addresses
+        if remote_workers not in self.remote_pools:
+            self.remote_pools[remote_workers] = RemoteEncoderPool(parse_addresses(remote_workers))
+        return self.remote_pools[remote_workers]
+
+    def _enqueue_build(self, spec):
+        """把构建快照加入队列"""
+        from encode_worker import parse_addresses
+        try:
+            remote_workers = ",".join(f"{host}:{port}" for host, port in
+                                      parse_addresses(self.remote_workers_edit.text()))
+        except ValueError:
+            remote_workers = ""
+        job = {
+            'id': self._next_job_id,
+            'spec': spec,
+            'thread': None,
+            'status': "排队中",
+            'started': None,
+            'remote_workers': remote_workers,
+        }
+        self._next_job_id += 1
+
+        row = self.queue_table.rowCount()
+        self.queue_table.insertRow(row)
+        params_text = f"{spec.fps} FPS, Q{spec.quality}"
+        if spec.source_fps:
+            params_text += f", 源 {spec.source_fps} FPS"
+        if remote_workers:
+            params_text += f", 远程 {len(remote_workers.split(','))} 节点"
+        for column, text in ((0, str(job['id'])), (1, spec.output_path), (2, params_text),
+                             (3, job['status']), (5, "")):
+            self.queue_table.setItem(row, column, QTableWidgetItem(text))
+        job_progress_bar = QProgressBar()
+        job_progress_bar.setValue(0)
+        self.queue_table.setCellWidget(row, 4, job_progress_bar)
+        job['progress_bar'] = job_progress_bar
+
+        self.build_jobs.append(job)
+        self.status_label.setText(f"任务 #{job['id']} 已加入构建队列")
+        self._start_queued_jobs()
+
+    def _job_row(self, job):
+        for row in range(self.queue_table.rowCount()):
+            if self.queue_table.item(row, 0).text() == str(job['id']):
+                return row
+        return -1
+
+    def _set_job_status(self, job, status, detail=None):
+        job['status'] = status
+        row = self._job_row(job)
+        if row >= 0:
+            item = self.queue_table.item(row, 3)
+            item.setText(status)
+            item.setToolTip(detail or "")
+
+    def _start_queued_jobs(self):
+        """在并行任务数限制内启动排队中的任务"""
+        running_count = sum(1 for job in self.build_jobs if job['status'] == "进行中")
+        for job in self.build_jobs:
+            if running_count >= self.max_jobs_spinbox.value():
+                break
+            if job['status'] != "排队中":
+                continue
+
+            thread = AnimationCreator(job['spec'], self._encoder_for(job['remote_workers']))
+            thread.progress.connect(job['progress_bar'].setValue)
+            thread.throughput.connect(lambda fps, j=job: self.on_job_throughput(j, fps))
+            thread.finished.connect(lambda message, j=job: self.on_animation_finished(j, message))
+            thread.error.connect(lambda message, j=job: self.on_animation_error(j, message))
+            thread.cancelled.connect(lambda message, j=job: self.on_animation_cancelled(j, message))
+            job['thread'] = thread
+            job['started'] = time.perf_counter()
+            self._set_job_status(job, "进行中")
+            thread.start()
+            running_count += 1
+        self._update_queue_status()
+
+    def _update_queue_status(self):
+        running_count = sum(1 for job in self.build_jobs if job['status'] == "进行中")
+        queued_count = sum(1 for job in self.build_jobs if job['status'] == "排队中")
+        if running_count or queued_count:
+            self.status_label.setText(f"正在创建动画: {running_count} 个进行中，{queued_count} 个排队中")
+
+    def on_job_throughput(self, job, frames_per_second):
+        """更新任务的编码速度"""
+        row = self._job_row(job)
+        if row >= 0:
+            self.queue_table.item(row, 5).setText(f"{frames_per_second:.1f} 帧/秒")
+
+    def cancel_selected_jobs(self):
+        """取消所选的排队中或进行中的任务"""
+        selected_rows = set(index.row() for index in self.queue_table.selectionModel().selectedRows())
+        for job in self.build_jobs:
+            if self._job_row(job) not in selected_rows:
+                continue
+            if job['status'] == "排队中":
+                self._set_job_status(job, "已取消")
+            elif job['status'] == "进行中":
+                job['thread'].cancel()
+                self._set_job_status(job, "正在取消")
+        self._update_queue_status()
+
+    def clear_finished_jobs(self):
+        """从队列中移除已结束的任务"""
+        for job in list(self.build_jobs):
+            if job['status'] in ("已完成", "失败", "已取消"):
+                row = self._job_row(job)
+                if row >= 0:
+                    self.queue_table.removeRow(row)
+                self.build_jobs.remove(job)
+
+    def _finish_job(self, job, status, message):
+        job['progress_bar'].setValue(100 if status == "已完成" else job['progress_bar'].value())
+        self._set_job_status(job, status, message)
+        job['thread'].wait()
+        self._start_queued_jobs()
+        if self._watch_rebuild_pending:
+            self._request_watch_rebuild()
+        if not any(j['status'] in ("排队中", "进行中", "正在取消") for j in self.build_jobs):
+            self.status_label.setText(f"任务 #{job['id']}: {message}")
     
-    def on_animation_finished(self, message):
+    def on_animation_finished(self, job, message):
         """动画创建完成"""
-        self.create_btn.setEnabled(True)
-        self.progress_bar.setVisible(False)
-        self.status_label.setText(message)
-        QMessageBox.information(self, "成功", message)
+        elapsed = time.perf_counter() - job['started']
+        self._finish_job(job, "已完成", f"{message} 耗时 {elapsed:.1f} 秒")
     
-    def on_animation_error(self, error_message):
+    def on_animation_error(self, job, error_message):
         """动画创建出错"""
-        self.create_btn.setEnabled(True)
-        self.progress_bar.setVisible(False)
-        self.status_label.setText("创建失败")
-        QMessageBox.critical(self, "错误", error_message)
+        self._finish_job(job, "失败", error_message)
+        QMessageBox.critical(self, "错误", f"任务 #{job['id']} 失败: {error_message}")
+
+    def on_animation_cancelled(self, job, message):
+        """动画创建已取消"""
+        self._finish_job(job, "已取消", message)
+
+    def closeEvent(self, event):
+        """关闭窗口时取消所有构建任务并释放共享线程池"""
+        for job in self.build_jobs:
+            if job['status'] == "排队中":
+                job['status'] = "已取消"
+            elif job['thread'] is not None and job['thread'].isRunning():
+                job['thread'].cancel()
+        for job in self.build_jobs:
+            if job['thread'] is not None:
+                job['thread'].wait()
+        self.folder_watcher.stop()
+        if self.encode_executor is not None:
+            self.encode_executor.shutdown(wait=True)
+        for pool in self.remote_pools.values():
+            pool.shutdown(wait=True)
+        super().closeEvent(event)
+
+    def _segment_source_dirs(self):
+        """返回 {段落: 源目录}，只包含所有图片都位于同一目录的段落"""
+        segment_dirs = {}
+        for img_d in self.images_data:
+            seg_idx = img_d.get('segment') or 0
+            directory = os.path.dirname(os.path.abspath(img_d['path']))
+            segment_dirs.setdefault(seg_idx, set()).add(directory)
+        return {seg_idx: dirs.pop() for seg_idx, dirs in segment_dirs.items() if len(dirs) == 1}
+
+    def _refresh_watch_paths(self):
+        """按当前图片列表更新监视的目录和文件"""
+        segment_dirs = self._segment_source_dirs()
+        # 段落图片被外部全部删除后仍继续监视原目录，以便重新导出时恢复
+        for seg_idx in range(len(self.segment_widgets_list)):
+            previous_dir = self.folder_watcher.segment_dir(seg_idx)
+            if seg_idx not in segment_dirs and previous_dir and \
+               not any((img_d.get('segment') or 0) == seg_idx for img_d in self.images_data):
+                segment_dirs[seg_idx] = previous_dir
+        # 新监视的目录先记录一次扫描结果，之后的变化都与它比较
+        for seg_idx, directory in segment_dirs.items():
+            directory = os.path.abspath(directory)
+            if self._watch_scans.get(seg_idx, (None,))[0] != directory:
+                self._watch_scans[seg_idx] = (directory, scan_image_dir(directory))
+        segment_files = {}
+        for img_d in self.images_data:
+            segment_files.setdefault(img_d.get('segment') or 0, []).append(img_d['path'])
+        self.folder_watcher.set_segments(segment_dirs, segment_files)
+
+    def toggle_watch_mode(self, enabled):
+        """开启或关闭源文件夹监视"""
+        if not enabled:
+            self.folder_watcher.stop()
+            self._watch_scans = {}
+            self._watch_rebuild_pending = False
+            self.status_label.setText("已停止监视源文件夹")
+            return
+
+        if not self.output_path_edit.text().strip():
+            QMessageBox.warning(self, "警告", "请先选择输出路径！")
+            self.watch_checkbox.setChecked(False)
+            return
+        segment_dirs = self._segment_source_dirs()
+        if not segment_dirs:
+            QMessageBox.warning(self, "警告", "没有可监视的段落：每个段落的图片需要位于同一文件夹中。")
+            self.watch_checkbox.setChecked(False)
+            return
+
+        self._refresh_watch_paths()
+        watched_text = "，".join(f"Part {seg_idx}" for seg_idx in sorted(segment_dirs))
+        self.status_label.setText(f"正在监视 {watched_text} 的源文件夹")
+        self._request_watch_rebuild()
+
+    def on_watched_segment_changed(self, segment_index):
+        """源目录变化：增量更新该段落的图片列表并在后台重建
+
+        与上一次扫描该目录的结果比较，只加入上次扫描之后新出现的文件；
+        目录中原有但用户未导入或已移除 (例如剔除的近似帧) 的文件不会被重新加入。
+        """
+        directory = self.folder_watcher.segment_dir(segment_index)
+        if directory is None or segment_index >= len(self.segment_widgets_list):
+            return
+
+        from PIL import Image
+        previous_dir, previous_scan = self._watch_scans.get(segment_index, (None, None))
+        scanned = scan_image_dir(directory)
+        if previous_dir != directory:
+            # 没有该目录的基准扫描，以当前图片列表中的状态为基准
+            previous_scan = {img_d['path']: img_d.get('file_state') for img_d in self.images_data
+                             if (img_d.get('segment') or 0) == segment_index}
+        entries = [img_d for img_d in self.images_data if (img_d.get('segment') or 0) == segment_index]
+        entry_index = {img_d['path']: idx for idx, img_d in enumerate(entries)}
+        new_scan = dict(scanned)
+        added_count = changed_count = 0
+
+        def read_entry(f_path, state):
+            try:
+                with Image.open(f_path) as img:
+                    return {
+                        'path': f_path,
+                        'size': img.size,
+                        'format': img.format,
+                        'filename': os.path.basename(f_path),
+                        'segment': segment_index,
+                        'file_state': state
+                    }
+            except Exception as e:
+                # 文件可能仍在写入，写入完成后会再次触发
+                print(f"警告: 暂时无法读取图片 {f_path}: {e}")
+                return None
+
+        added_entries = []
+        for f_path, state in scanned.items():
+            if f_path not in previous_scan:
+                new_entry = read_entry(f_path, state)
+                if new_entry is None:
+                    del new_scan[f_path] # 下次扫描时仍视为新文件
+                    continue
+                added_entries.append(new_entry)
+                added_count += 1
+            elif previous_scan[f_path] != state and f_path in entry_index:
+                new_entry = read_entry(f_path, state)
+                if new_entry is None:
+                    new_scan[f_path] = previous_scan[f_path]
+                    continue
+                entries[entry_index[f_path]] = new_entry
+                changed_count += 1
+        removed_paths = set(entry_index) - set(scanned)
+        entries = [img_d for img_d in entries if img_d['path'] not in removed_paths]
+        # 新文件按文件名插到段落中排在它前面的最后一帧之后 (与目录扫描顺序一致)，
+        # 删除后重新导出的帧回到原来的位置，而不是追加到末尾
+        for new_entry in added_entries:
+            insert_at = 0
+            for idx, img_d in enumerate(entries):
+                if img_d['filename'] < new_entry['filename']:
+                    insert_at = idx + 1
+            entries.insert(insert_at, new_entry)
+        self._watch_scans[segment_index] = (directory, new_scan)
+
+        if not (added_count or changed_count or removed_paths):
+            return
+
+        self.images_data = [img_d for img_d in self.images_data
+                            if (img_d.get('segment') or 0) != segment_index] + entries
+        self.update_image_list()
+        self.status_label.setText(
+            f"Part {segment_index}: 新增 {added_count}，修改 {changed_count}，删除 {len(removed_paths)} 帧，正在后台重建..."
+        )
+        self._request_watch_rebuild()
+
+    def _request_watch_rebuild(self):
+        """监视模式下重建输出；同一输出的旧任务先取消，结束后再重建"""
+        if not self.watch_checkbox.isChecked():
+            self._watch_rebuild_pending = False
+            return
+        output_path = self.output_path_edit.text().strip()
+        if not output_path or not self.images_data:
+            return
+
+        active_jobs = self._active_jobs_for(output_path)
+        for job in active_jobs:
+            if job['status'] == "排队中":
+                self._set_job_status(job, "已取消")
+            elif job['status'] == "进行中":
+                # 已完成的帧保留在缓存中，新任务会直接复用
+                job['thread'].cancel()
+                self._set_job_status(job, "正在取消")
+        if any(job['status'] == "正在取消" for job in active_jobs):
+            self._watch_rebuild_pending = True
+            return
+
+        self._watch_rebuild_pending = False
+        self._enqueue_build(self._snapshot_project(output_path))
+
 
+def main(profiler=None):
+    """主函数
 
-def main():
-    """主函数"""
+    profiler: run.py 的 StartupProfiler，为 None 时不记录启动耗时。
+    """
+    if profiler:
+        profiler.begin("创建 QApplication")
     app = QApplication(sys.argv)
     # 设置全局样式
+    if profiler:
+        profiler.begin("加载样式表")
     style_file = Path(__file__).parent / "style.qss"
     if style_file.exists():
         with open(style_file, "r") as f:
             app.setStyleSheet(f.read())
+    if profiler:
+        profiler.begin("构建主窗口")
     creator = BootAnimationCreator()
     creator.setWindowTitle("开关机动画制作工具")
+    if profiler:
+        profiler.begin("显示窗口并首次绘制")
     creator.show()
+    if profiler:
+        # 进入事件循环、窗口首次绘制完成后输出报告
+        QTimer.singleShot(0, profiler.report)
     sys.exit(app.exec_())
 
 
@@ -2,26 +2,96 @@
 # -*- coding: utf-8 -*-
 """
 启动脚本 - 开关机动画制作工具
+
+用法:
+    python run.py                    启动程序
+    python run.py --profile-startup  启动并输出各阶段和各模块导入耗时
 """
 
 import sys
 import os
+import time
+import builtins
+import importlib.util
 from pathlib import Path
 
+# 模块名 -> pip 包名
+REQUIRED_PACKAGES = (('PyQt5', 'PyQt5'), ('PIL', 'Pillow'), ('numpy', 'numpy'))
+
+
+class StartupProfiler:
+    """记录启动各阶段耗时，以及每个模块首次导入的耗时 (含/不含子模块)"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = [] # (阶段名, 耗时)
+        self.imports = [] # (模块名, 总耗时, 自身耗时, 嵌套深度)
+        self._phase_name = None
+        self._phase_start = None
+        self._import_stack = [] # 正在导入的模块的子模块耗时累计
+        self._original_import = None
+        self._reported = False
+
+    def install(self):
+        """替换 builtins.__import__，记录首次导入的模块"""
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        depth = len(self._import_stack)
+        self._import_stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._import_stack.pop()
+            if self._import_stack:
+                self._import_stack[-1] += elapsed
+            self.imports.append((name, elapsed, elapsed - children, depth))
+
+    def begin(self, name):
+        """开始一个阶段 (自动结束上一个阶段)"""
+        self.end()
+        self._phase_name = name
+        self._phase_start = time.perf_counter()
+
+    def end(self):
+        if self._phase_name is not None:
+            self.phases.append((self._phase_name, time.perf_counter() - self._phase_start))
+            self._phase_name = None
+
+    def report(self, top=15):
+        """输出启动耗时报告 (只输出一次)"""
+        if self._reported:
+            return
+        self._reported = True
+        self.end()
+        self.uninstall()
+        total = time.perf_counter() - self.start
+        print("\n⏱️ 启动耗时报告")
+        print(f"   总计: {total * 1000:.1f} ms")
+        print("   阶段:")
+        for name, elapsed in self.phases:
+            print(f"     {elapsed * 1000:8.1f} ms  {name}")
+        print(f"   模块导入 (按总耗时排序，前 {top} 项；自身耗时不含子模块):")
+        for name, elapsed, self_time, depth in sorted(self.imports, key=lambda item: -item[1])[:top]:
+            print(f"     {elapsed * 1000:8.1f} ms  (自身 {self_time * 1000:6.1f} ms)  {'  ' * depth}{name}")
+        sys.stdout.flush()
+
+
 def check_dependencies():
-    """检查依赖是否安装"""
-    missing_deps = []
-    
-    try:
-        import PyQt5
-    except ImportError:
-        missing_deps.append('PyQt5')
-    
-    try:
-        import PIL
-    except ImportError:
-        missing_deps.append('Pillow')
-    
+    """检查依赖是否安装 (只查找模块，不导入，避免拖慢启动)"""
+    missing_deps = [package for module_name, package in REQUIRED_PACKAGES
+                    if importlib.util.find_spec(module_name) is None]
+
     if missing_deps:
         print("❌ 缺少以下依赖:")
         for dep in missing_deps:
@@ -29,24 +99,34 @@ def check_dependencies():
         print("\n请运行以下命令安装依赖:")
         print("pip install -r requirements.txt")
         print("\n或者手动安装:")
-        print("pip install PyQt5 Pillow")
+        print("pip install PyQt5 Pillow numpy")
         return False
-    
+
     return True
 
 def main():
     """主函数"""
+    profiler = None
+    if "--profile-startup" in sys.argv[1:]:
+        sys.argv.remove("--profile-startup")
+        profiler = StartupProfiler()
+        profiler.install()
+
     print("🚀 启动开关机动画制作工具...") # Removed "Android"
-    
+
     # 检查依赖
+    if profiler:
+        profiler.begin("检查依赖")
     if not check_dependencies():
         sys.exit(1)
-    
+
     # 导入主程序
     try:
+        if profiler:
+            profiler.begin("导入主程序 (PyQt5)")
         from main import main as run_main
         print("✅ 依赖检查通过，启动程序...")
-        run_main()
+        run_main(profiler)
     except Exception as e:
         print(f"❌ 启动失败: {e}")
         sys.exit(1)